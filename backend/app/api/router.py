@@ -1,47 +1,67 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
 from fastapi.responses import StreamingResponse, JSONResponse
 from typing import List, Optional, Dict, Any
-import json
-import io
+import asyncio
+import pybase64
 
-from app.models.schemas import UserSettings, ProcessedFrame
-from app.services.vision_service import VisionService
-from app.services.speech_service import SpeechService
-from app.services.agent_service import AgentService
+from app.models.schemas import UserSettings, ProcessedFrame, EMPTY_FRAME
+from app.config import settings
+from app.services.registry import get_vision_service, get_speech_service, get_agent_service, decode_pool
+from app.utils.helpers import decode_and_resize, decode_and_resize_stream
 
 router = APIRouter()
 
-# Initialize services
-vision_service = VisionService()
-speech_service = SpeechService()
-agent_service = AgentService()
+# Built once at import rather than on every /ask call
+_AUDIO_DATA_URL_PREFIX = "data:audio/mp3;base64,"
+
+async def _decode_upload(upload: UploadFile):
+    """Decode and resize an uploaded image in the decode pool, straight from its spooled file"""
+    loop = asyncio.get_running_loop()
+    frame = await loop.run_in_executor(
+        decode_pool, decode_and_resize_stream, upload.file, settings.UPLOAD_IMAGE_MAX_SIZE
+    )
+    if frame is None:
+        raise ValueError("Could not decode image")
+    return frame
+
+async def _decode_image(image_bytes: bytes):
+    """Decode and resize an image sent inline in a request body, in the decode pool"""
+    loop = asyncio.get_running_loop()
+    frame = await loop.run_in_executor(
+        decode_pool, decode_and_resize, image_bytes, settings.UPLOAD_IMAGE_MAX_SIZE
+    )
+    if frame is None:
+        raise ValueError("Could not decode image")
+    return frame
 
 @router.post("/settings", response_model=Dict[str, Any])
 async def update_settings(settings: UserSettings):
     """Update user settings"""
     # In a real implementation, you'd store these settings in a database
     # For this simple example, we'll just return the settings back
-    return {"status": "success", "settings": settings.dict()}
+    return {"status": "success", "settings": settings}
 
 @router.post("/analyze-image", response_model=ProcessedFrame)
 async def analyze_image(
     file: UploadFile = File(...),
-    query: Optional[str] = Form(None)
+    query: Optional[str] = Form(None),
+    vision_service=Depends(get_vision_service),
+    agent_service=Depends(get_agent_service)
 ):
     """
     Analyze an uploaded image and optionally answer a query about it
     """
     try:
-        # Read the image data
-        image_data = await file.read()
-        
-        # Process the image
-        processed_frame = await vision_service.process_frame(image_data)
+        # Decode the image straight from the upload's spooled file, without an intermediate bytes copy
+        frame = await _decode_upload(file)
+        # Uploads are always analyzed; only WebSocket streams skip frames
+        processed_frame = await vision_service.process_frame_batched(frame)
         
         # If a query was provided, process it with the agent
         if query:
             response, voice_feedback = await agent_service.process_query(query, processed_frame)
-            processed_frame.voiceFeedback = voice_feedback
+            # Copy rather than modify the result, which the vision service may hand out again
+            processed_frame = processed_frame.model_copy(update={"voiceFeedback": voice_feedback})
         
         return processed_frame
     
@@ -52,7 +72,7 @@ async def analyze_image(
         )
 
 @router.post("/text-to-speech", response_class=StreamingResponse)
-async def text_to_speech(data: Dict[str, str]):
+async def text_to_speech(data: Dict[str, str], speech_service=Depends(get_speech_service)):
     """
     Convert text to speech
     """
@@ -64,12 +84,9 @@ async def text_to_speech(data: Dict[str, str]):
                 detail="Text is required"
             )
         
-        # Generate speech
-        audio_data = await speech_service.text_to_speech(text)
-        
-        # Return the audio as a streaming response
+        # Stream the audio as OpenAI produces it instead of waiting for the whole file
         return StreamingResponse(
-            io.BytesIO(audio_data),
+            speech_service.text_to_speech_stream(text),
             media_type="audio/mp3"
         )
     
@@ -82,7 +99,12 @@ async def text_to_speech(data: Dict[str, str]):
         )
 
 @router.post("/ask", response_model=Dict[str, Any])
-async def ask_question(data: Dict[str, Any]):
+async def ask_question(
+    data: Dict[str, Any],
+    vision_service=Depends(get_vision_service),
+    speech_service=Depends(get_speech_service),
+    agent_service=Depends(get_agent_service)
+):
     """
     Ask a question and get a response
     """
@@ -98,25 +120,26 @@ async def ask_question(data: Dict[str, Any]):
         
         # If image data was provided, process it
         if image_data:
-            # Decode base64 image data
-            import base64
-            image_bytes = base64.b64decode(image_data.split(",")[1] if "," in image_data else image_data)
-            processed_frame = await vision_service.process_frame(image_bytes)
+            # Decode base64 image data, given either bare or as a data URL
+            image_bytes = pybase64.b64decode(image_data.split(",")[1] if "," in image_data else image_data)
+            frame = await _decode_image(image_bytes)
+            processed_frame = await vision_service.process_frame_batched(frame)
         else:
-            # Create an empty frame
-            processed_frame = ProcessedFrame(captions=[], frame_id="no-image")
+            # Use the shared empty frame
+            processed_frame = EMPTY_FRAME
         
         # Process the question
         response, voice_feedback = await agent_service.process_query(question, processed_frame)
         
         # Generate speech
         audio_data = await speech_service.text_to_speech(response)
-        audio_base64 = base64.b64encode(audio_data).decode("utf-8")
+        audio_base64 = pybase64.b64encode_as_string(audio_data)
         
         return {
             "text_response": response,
-            "audio_response": f"data:audio/mp3;base64,{audio_base64}",
-            "processed_frame": processed_frame.dict()
+            "audio_response": _AUDIO_DATA_URL_PREFIX + audio_base64,
+            # The model is serialized in the same pass as the rest of the response
+            "processed_frame": processed_frame
         }
     
     except Exception as e:
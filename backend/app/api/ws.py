@@ -1,126 +1,550 @@
 import asyncio
-import json
+import functools
+import hashlib
+import itertools
 import logging
 import uuid
 import time
-from typing import Dict, List, Optional, Any, Callable
-import base64
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Awaitable, Deque, Dict, List, Optional, Any, Callable, Set, Tuple, Union
+import pybase64
 from starlette.websockets import WebSocketState
-from datetime import datetime
+import anyio
+from anyio.abc import TaskGroup
+import orjson
+import msgpack
 
 from fastapi import WebSocket, WebSocketDisconnect, Depends, status
-from pydantic import ValidationError
+from pydantic import BaseModel, ValidationError
 
-from app.models.schemas import ProcessedFrame, Caption, CaptionType, CaptionPriority, VoiceFeedback
-from app.services.vision_service import VisionService
-from app.services.speech_service import SpeechService
-from app.services.agent_service import AgentService
+from app.config import settings
+from app.models.schemas import EMPTY_FRAME, ProcessedFrame, Caption, CaptionType, CaptionPriority, VoiceFeedback
+from app.services.registry import get_vision_service, get_speech_service, get_agent_service
 from app.services.memory_service import MemoryService
 
 logger = logging.getLogger(__name__)
 
+# ProcessedFrame fields sent to the frontend; objects is the name/distance/direction summary of detected_objects
+_CLIENT_FRAME_FIELDS = {"captions", "voiceFeedback", "objects"}
+
+# Type prefixes for binary WebSocket messages
+BINARY_VIDEO = 0x00
+BINARY_AUDIO = 0x01
+BINARY_AUDIO_CHUNK = 0x02  # server -> client: a chunk of streamed speech
+BINARY_AUDIO_END = 0x03  # server -> client: end of the speech stream
+
+# Read on every message, so resolved once at import
+_MAX_TEXT_SIZE = settings.WS_MAX_TEXT_SIZE
+_MAX_MESSAGE_SIZE = settings.WS_MAX_MESSAGE_SIZE
+
+# Subprotocol a client can request to exchange MessagePack instead of JSON
+MSGPACK_SUBPROTOCOL = "msgpack"
+
+def _orjson_default(obj: Any) -> Any:
+    """Serialize pydantic models embedded in outgoing messages"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+def _msgpack_default(obj: Any) -> Any:
+    """Convert pydantic models and numpy values, which msgpack can't pack natively"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+# Outgoing encoders. Models can be placed in messages as-is and are serialized in the
+# same pass as the rest of the message; numpy values serialize without conversion.
+_dumps = functools.partial(orjson.dumps, default=_orjson_default, option=orjson.OPT_SERIALIZE_NUMPY)
+_packb = functools.partial(msgpack.packb, use_bin_type=True, default=_msgpack_default)
+
+def _model_payload(model: BaseModel, use_msgpack: bool, include: Optional[set] = None) -> bytes:
+    """Serialize a pydantic model on its own, in either wire format"""
+    if use_msgpack:
+        return _packb(model.model_dump(mode="json", include=include))
+    # Straight to JSON bytes without building an intermediate dict
+    return model.model_dump_json(include=include).encode()
+
+# Already packed messages are spliced into a {"batch": [...]} map without re-encoding
+_MSGPACK_BATCH_PREFIX = b"\x81" + msgpack.packb("batch")
+_msgpack_array_header = msgpack.Packer().pack_array_header
+
+# Error envelopes and the query fallback are shaped once; only their volatile
+# fields are filled in per message
+_ERROR_PREFIX = b'{"error":'
+
+_QUERY_FALLBACK_TEXT = (
+    "I heard you say '{transcription}', but I'm having trouble processing your request right now. "
+    "Please try again in a moment."
+)
+
+_QUERY_FALLBACK_MESSAGE = {
+    "captions": [
+        {
+            "id": "__ID__",
+            "text": "__TEXT__",
+            "type": "audio",
+            "priority": "medium",
+            "timestamp": "__TS__"
+        }
+    ],
+    "voiceFeedback": {
+        "text": "__FALLBACK__",
+        "priority": "high",
+        "timestamp": "__TS__"
+    },
+    "objects": []  # Include empty objects array to match expected structure
+}
+
+_QUERY_FALLBACK_TEMPLATE = orjson.dumps(_QUERY_FALLBACK_MESSAGE)
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
-        self.vision_service = VisionService()
-        self.speech_service = SpeechService()
-        self.agent_service = AgentService()
-        self.memory_service = MemoryService()
+        # Connections that negotiated the msgpack subprotocol; everyone else gets JSON
+        self.msgpack_connections: Set[str] = set()
+        # Settings read on every frame or send, resolved once
+        self.frame_cache_size = settings.FRAME_CACHE_SIZE
+        self.send_timeout = settings.WS_SEND_TIMEOUT
+        self.agent_frame_max_age = settings.AGENT_FRAME_MAX_AGE
+        
+        # Each connection's workers run in a task group owned by its endpoint;
+        # cancelling the scope stops all of that connection's work at once
+        self.cancel_scopes: Dict[str, anyio.CancelScope] = {}
+        
+        # Bounded queue of audio/text jobs per connection, drained by a single consumer;
+        # jobs arriving while it is full are rejected rather than dropping queued ones
+        self.job_queues: Dict[str, asyncio.Queue] = {}
+        
+        # Newest-wins video slot per connection: a frame that arrives while another is
+        # being processed replaces any frame still waiting, so stale frames are skipped
+        self.latest_frame: Dict[str, Union[bytes, memoryview]] = {}
+        self.frame_events: Dict[str, asyncio.Event] = {}
+        
+        # Bounded outgoing queue per connection, written out by a dedicated writer
+        # so a client that stops reading can't stall frame processing or broadcasts
+        self.send_queues: Dict[str, asyncio.Queue] = {}
         
-        # Mapping of connection ID to processing task
-        self.tasks: Dict[str, asyncio.Task] = {}
+        # Per-connection count of frames dropped for being stale, logged on disconnect
+        self.dropped: Dict[str, int] = {}
+        
+        # Conversation history and scene memory per connection, so users don't share a session.
+        # MemoryService keeps everything in bounded deques, so a long session can't grow without limit
+        self.memories: Dict[str, MemoryService] = {}
+        
+        # Latest analyzed frame per connection with when it was analyzed, so queries are
+        # answered about what the camera sees now; newer frames overwrite older ones
+        self.latest_processed: Dict[str, Tuple[float, ProcessedFrame]] = {}
+        
+        # Per-connection counters for caption IDs; IDs only need to be unique within a session
+        self._id_counters: Dict[str, itertools.count] = {}
+        
+        # LRU cache of processed frames keyed by a hash of the frame bytes, so identical frames
+        # (static scenes, duplicates) skip inference. Each entry also keeps the client payload,
+        # keyed by whether it is msgpack, serialized on first send so repeats skip encoding too
+        self._frame_cache: "OrderedDict[bytes, Tuple[ProcessedFrame, Dict[bool, bytes]]]" = OrderedDict()
+    
+    # Services resolve through the registry on first use, so importing this module doesn't load them
+    @property
+    def vision_service(self):
+        return get_vision_service()
+    
+    @property
+    def speech_service(self):
+        return get_speech_service()
+    
+    @property
+    def agent_service(self):
+        return get_agent_service()
     
     async def connect(self, websocket: WebSocket) -> str:
         """
         Accept a new WebSocket connection and return a connection ID
         """
-        await websocket.accept()
+        # Use MessagePack if the client asked for it
+        use_msgpack = MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+        await websocket.accept(subprotocol=MSGPACK_SUBPROTOCOL if use_msgpack else None)
+        
         connection_id = str(uuid.uuid4())
         self.active_connections[connection_id] = websocket
+        if use_msgpack:
+            self.msgpack_connections.add(connection_id)
+        self._id_counters[connection_id] = itertools.count()
+        self.memories[connection_id] = MemoryService()
+        self.dropped[connection_id] = 0
+        
+        # Queues for this connection's jobs, frames and outgoing messages
+        self.job_queues[connection_id] = asyncio.Queue(maxsize=settings.WS_QUEUE_SIZE)
+        self.frame_events[connection_id] = asyncio.Event()
+        self.send_queues[connection_id] = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
         return connection_id
     
+    def start_workers(self, task_group: TaskGroup, connection_id: str) -> None:
+        """Start the consumers and writer for a connection inside its task group"""
+        self.cancel_scopes[connection_id] = task_group.cancel_scope
+        task_group.start_soon(self._consumer, connection_id)
+        task_group.start_soon(self._frame_consumer, connection_id)
+        task_group.start_soon(self._writer, connection_id)
+    
     async def disconnect(self, connection_id: str) -> None:
         """
-        Remove a WebSocket connection and cancel any associated tasks
+        Remove a WebSocket connection and cancel all of its in-flight work
+        """
+        self.active_connections.pop(connection_id, None)
+        self.msgpack_connections.discard(connection_id)
+        
+        self.job_queues.pop(connection_id, None)
+        self.latest_frame.pop(connection_id, None)
+        self.frame_events.pop(connection_id, None)
+        self.send_queues.pop(connection_id, None)
+        self._id_counters.pop(connection_id, None)
+        self.memories.pop(connection_id, None)
+        self.latest_processed.pop(connection_id, None)
+        if get_vision_service.created():
+            self.vision_service.forget(connection_id)
+        
+        dropped = self.dropped.pop(connection_id, 0)
+        if dropped:
+            logger.info(f"Connection {connection_id} dropped {dropped} stale frames")
+        
+        # Cancel the connection's task group, which also ends its receive loop
+        scope = self.cancel_scopes.pop(connection_id, None)
+        if scope is not None:
+            scope.cancel()
+    
+    def uses_msgpack(self, connection_id: str) -> bool:
+        """Whether a connection exchanges MessagePack instead of JSON"""
+        return connection_id in self.msgpack_connections
+    
+    def next_id(self, connection_id: str) -> str:
+        """Return the next caption ID for a connection"""
+        counter = self._id_counters.get(connection_id)
+        if counter is None:
+            return uuid.uuid4().hex
+        return f"{connection_id}-{next(counter)}"
+    
+    async def enqueue(self, connection_id: str, kind: str, payload: Any) -> None:
         """
-        if connection_id in self.active_connections:
-            del self.active_connections[connection_id]
+        Queue an audio or text job for the connection's consumer.
+        These are the user's own questions, so unlike frames none are dropped to stay
+        real-time: when the queue is full the new job is rejected and the client told.
+        """
+        queue = self.job_queues.get(connection_id)
+        if queue is None:
+            return
+        
+        try:
+            queue.put_nowait((kind, payload))
+        except asyncio.QueueFull:
+            logger.warning(f"Job queue full for {connection_id}, rejecting {kind} job")
+            await self.send_error(connection_id, "Still working on your previous requests, please try again in a moment")
+    
+    async def _consumer(self, connection_id: str) -> None:
+        """Process queued jobs for a connection one at a time"""
+        queue = self.job_queues.get(connection_id)
+        if queue is None:
+            return
+        
+        while True:
+            kind, payload = await queue.get()
+            
+            # The consumer lives as long as the connection, so one failing job must not end it
+            try:
+                await self._dispatch_job(connection_id, kind, payload)
+            except Exception as e:
+                logger.error(f"Error running {kind} job: {str(e)}", exc_info=True)
+    
+    async def _dispatch_job(self, connection_id: str, kind: str, payload: Any) -> None:
+        """Run a single queued job"""
+        if kind == "audio":
+            await self.process_audio(connection_id, payload)
+        elif kind == "message":
+            await self.handle_user_message(connection_id, payload)
+    
+    def submit_frame(self, connection_id: str, frame_data: Union[bytes, memoryview]) -> None:
+        """Make this the next frame to process, replacing any frame still waiting"""
+        event = self.frame_events.get(connection_id)
+        if event is None:
+            return
         
-        # Cancel any running task for this connection
-        if connection_id in self.tasks:
-            self.tasks[connection_id].cancel()
-            del self.tasks[connection_id]
+        if connection_id in self.latest_frame:
+            self.dropped[connection_id] += 1
+        self.latest_frame[connection_id] = frame_data
+        event.set()
+    
+    async def _frame_consumer(self, connection_id: str) -> None:
+        """Process the most recent frame for a connection whenever one is waiting"""
+        event = self.frame_events.get(connection_id)
+        if event is None:
+            return
+        
+        while True:
+            await event.wait()
+            event.clear()
+            
+            frame_data = self.latest_frame.pop(connection_id, None)
+            if not frame_data:
+                continue
+            
+            try:
+                await self.process_video_frame(connection_id, frame_data)
+            except Exception as e:
+                logger.error(f"Error running video job: {str(e)}", exc_info=True)
     
     async def send_message(self, connection_id: str, message: dict) -> None:
         """Send a message to a specific client"""
-        if connection_id in self.active_connections:
+        if connection_id in self.msgpack_connections:
+            payload = _packb(message)
+        else:
+            payload = _dumps(message)
+        await self.send_bytes(connection_id, payload)
+    
+    async def _send_model(self, connection_id: str, model: BaseModel, include: Optional[set] = None) -> None:
+        """Serialize a pydantic model in the client's format and send it"""
+        payload = _model_payload(model, connection_id in self.msgpack_connections, include)
+        await self.send_bytes(connection_id, payload)
+    
+    async def send_bytes(self, connection_id: str, payload: bytes, coalesce: bool = True) -> None:
+        """
+        Queue an already serialized message for a specific client.
+        Messages with coalesce set may be merged with others queued behind them
+        into a single batch frame; raw binary payloads must pass coalesce=False.
+        A client whose queue is full isn't keeping up and is disconnected.
+        """
+        queue = self.send_queues.get(connection_id)
+        if queue is None:
+            return
+        
+        try:
+            queue.put_nowait((payload, coalesce))
+        except asyncio.QueueFull:
+            await self._drop_slow_client(connection_id)
+    
+    async def _drop_slow_client(self, connection_id: str) -> None:
+        """Close and remove a client whose send queue is full"""
+        logger.warning(f"Send queue full for {connection_id}, dropping slow client")
+        # Stop queueing for this client before closing so concurrent senders return early
+        self.send_queues.pop(connection_id, None)
+        websocket = self.active_connections.get(connection_id)
+        if websocket is not None:
             try:
-                websocket = self.active_connections[connection_id]
-                # Check if the connection is still open
-                if websocket.client_state == WebSocketState.CONNECTED:
-                    await websocket.send_json(message)
-                else:
-                    logger.warning(f"Connection {connection_id} no longer connected")
-                    await self.disconnect(connection_id)
-            except RuntimeError as e:
-                if "close message" in str(e):
-                    logger.warning(f"Connection {connection_id} already closed, removing")
-                    await self.disconnect(connection_id)
-                else:
-                    logger.error(f"RuntimeError when sending message: {str(e)}")
-            except Exception as e:
-                logger.error(f"Error sending message: {str(e)}")
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            except Exception:
+                pass
+        await self.disconnect(connection_id)
+    
+    async def _writer(self, connection_id: str) -> None:
+        """
+        Write queued messages to a client in order.
+        Whatever has piled up while the previous write was in flight is drained at once,
+        and consecutive messages are coalesced into one {"batch": [...]} frame.
+        A queued stream is read only as fast as it's written, one chunk at a time, and
+        messages queued meanwhile are sent between its chunks instead of waiting for it to end.
+        """
+        queue = self.send_queues.get(connection_id)
+        if queue is None:
+            return
+        
+        streams: Deque[AsyncIterator[bytes]] = deque()
+        while True:
+            if streams:
+                stream = streams.popleft()
+                try:
+                    async for chunk in stream:
+                        await self._write(connection_id, chunk)
+                        await self._write_pending(connection_id, self._drain(queue), streams)
+                except Exception as e:
+                    logger.error(f"Error streaming to {connection_id}: {str(e)}")
+                continue
+            
+            pending = [await queue.get()] + self._drain(queue)
+            await self._write_pending(connection_id, pending, streams)
+    
+    @staticmethod
+    def _drain(queue: asyncio.Queue) -> List[Tuple[Any, bool]]:
+        """Take everything currently in a send queue without waiting"""
+        items = []
+        while True:
+            try:
+                items.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return items
+    
+    async def _write_pending(
+        self,
+        connection_id: str,
+        pending: List[Tuple[Any, bool]],
+        streams: "Deque[AsyncIterator[bytes]]"
+    ) -> None:
+        """Write drained messages, coalescing where allowed; streams are set aside for the writer to play in turn"""
+        batch: List[bytes] = []
+        for payload, coalesce in pending:
+            if not isinstance(payload, bytes):
+                streams.append(payload)
+                continue
+            
+            if coalesce:
+                batch.append(payload)
+                continue
+            
+            # Flush the messages queued before this payload to keep ordering
+            if batch:
+                await self._write(connection_id, self._batch_payload(connection_id, batch))
+                batch = []
+            await self._write(connection_id, payload)
+        
+        if batch:
+            await self._write(connection_id, self._batch_payload(connection_id, batch))
+    
+    def _batch_payload(self, connection_id: str, payloads: List[bytes]) -> bytes:
+        """Join serialized messages into a single batch message, without re-encoding them"""
+        if len(payloads) == 1:
+            return payloads[0]
+        
+        if connection_id in self.msgpack_connections:
+            return _MSGPACK_BATCH_PREFIX + _msgpack_array_header(len(payloads)) + b"".join(payloads)
+        return b'{"batch":[' + b",".join(payloads) + b"]}"
+    
+    async def _write(self, connection_id: str, payload: bytes) -> None:
+        """Send a serialized message on the client's socket"""
+        # Look the socket up once so a concurrent disconnect can't remove it mid-send
+        websocket = self.active_connections.get(connection_id)
+        if websocket is None:
+            return
+        
+        try:
+            # Check if the connection is still open
+            if websocket.client_state == WebSocketState.CONNECTED:
+                # Bound each send so a stalled peer is dropped instead of holding its writer forever
+                await asyncio.wait_for(websocket.send_bytes(payload), timeout=self.send_timeout)
+            else:
+                logger.warning(f"Connection {connection_id} no longer connected")
+                await self.disconnect(connection_id)
+        except asyncio.TimeoutError:
+            logger.warning(f"Send to {connection_id} timed out, dropping slow client")
+            await self.disconnect(connection_id)
+        except RuntimeError as e:
+            if "close message" in str(e):
+                logger.warning(f"Connection {connection_id} already closed, removing")
                 await self.disconnect(connection_id)
+            else:
+                logger.error(f"RuntimeError when sending message: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error sending message: {str(e)}")
+            await self.disconnect(connection_id)
+    
+    async def send_stream(self, connection_id: str, chunks: AsyncIterator[bytes]) -> None:
+        """
+        Queue a stream of binary messages for a client. The whole stream takes a single
+        send queue slot, and the writer pulls chunks from it only as fast as the socket
+        drains, so a long stream can't get the client dropped as slow.
+        """
+        queue = self.send_queues.get(connection_id)
+        if queue is None:
+            return
+        try:
+            queue.put_nowait((chunks, False))
+        except asyncio.QueueFull:
+            await self._drop_slow_client(connection_id)
+    
+    async def stream_speech(self, connection_id: str, text: str) -> None:
+        """Stream synthesized speech to a client as binary audio chunks"""
+        await self.send_stream(connection_id, self._speech_chunks(text))
+    
+    async def _speech_chunks(self, text: str) -> AsyncIterator[bytes]:
+        """Synthesized speech as prefixed binary audio messages, ended by an end-of-speech marker"""
+        async for chunk in self.speech_service.text_to_speech_stream(text):
+            yield bytes((BINARY_AUDIO_CHUNK,)) + chunk
+        yield bytes((BINARY_AUDIO_END,))
     
     async def broadcast(self, message: dict) -> None:
         """
         Broadcast a message to all connected clients
         """
-        disconnected = []
-        for connection_id, connection in self.active_connections.items():
-            try:
-                await connection.send_json(message)
-            except Exception:
-                disconnected.append(connection_id)
+        # Serialize exactly once per wire format in use, and not at all for formats no client uses
+        json_clients = len(self.active_connections) - len(self.msgpack_connections)
+        json_payload = _dumps(message) if json_clients > 0 else None
+        msgpack_payload = _packb(message) if self.msgpack_connections else None
         
-        # Clean up any disconnected clients
-        for connection_id in disconnected:
-            await self.disconnect(connection_id)
+        # Queue for every client; each writer sends at its own pace and slow
+        # clients are dropped by send_bytes. Snapshot since the dict can change.
+        for connection_id in list(self.active_connections):
+            if connection_id in self.msgpack_connections:
+                await self.send_bytes(connection_id, msgpack_payload)
+            else:
+                await self.send_bytes(connection_id, json_payload)
     
-    async def process_video_frame(self, connection_id: str, frame_data: bytes) -> None:
+    async def process_video_frame(self, connection_id: str, frame_data: Union[bytes, memoryview]) -> None:
         """
         Process a video frame from the client
         """
         try:
-            # Process the frame with the vision service
-            processed_frame = await self.vision_service.process_frame(frame_data)
+            frame_hash = hashlib.blake2b(frame_data, digest_size=16).digest()
+            cached = self._frame_cache.get(frame_hash)
             
-            # Update the memory with detected objects and texts
-            if processed_frame.detected_objects:
-                self.memory_service.add_detected_objects(processed_frame.detected_objects)
+            if cached is not None:
+                self._frame_cache.move_to_end(frame_hash)
+                processed_frame, payloads = cached
+            else:
+                # Process the frame with the vision service, batched with other connections' frames.
+                # Frame skipping is tracked per connection, so skipped frames reuse this connection's own result
+                processed_frame = await self.vision_service.process_frame_batched(frame_data, skip_key=connection_id)
+                payloads = {}
+                
+                # Only cache frames that were actually analyzed for these bytes, not error
+                # results or an earlier frame's result handed back for a skipped frame
+                if processed_frame.raw_description and not processed_frame.skipped:
+                    self._frame_cache[frame_hash] = (processed_frame, payloads)
+                    if len(self._frame_cache) > self.frame_cache_size:
+                        self._frame_cache.popitem(last=False)
             
-            if processed_frame.detected_texts:
-                self.memory_service.add_detected_texts(processed_frame.detected_texts)
+            # Send only the fields the frontend expects back to the client.
+            # The client doesn't depend on the memory updates, so it is not kept waiting on them
+            use_msgpack = connection_id in self.msgpack_connections
+            payload = payloads.get(use_msgpack)
+            if payload is None:
+                payload = payloads[use_msgpack] = _model_payload(processed_frame, use_msgpack, _CLIENT_FRAME_FIELDS)
+            await self.send_bytes(connection_id, payload)
             
+            # Update the connection's memory with detected objects and texts
+            memory = self.memories.get(connection_id)
+            if memory is None:
+                return
+            
+            # A skipped frame's result was already recorded when its own frame was analyzed
+            if processed_frame.skipped:
+                return
+            
+            # Error results don't replace the last good view
             if processed_frame.raw_description:
-                self.memory_service.add_scene_description(processed_frame.raw_description)
+                self.latest_processed[connection_id] = (time.monotonic(), processed_frame)
             
-            # Normalize the response to match the frontend's expected structure
-            normalized_frame = {
-                "captions": [caption.model_dump() for caption in processed_frame.captions],
-                "voiceFeedback": processed_frame.voiceFeedback.model_dump() if processed_frame.voiceFeedback else None,
-                "objects": processed_frame.objects  # This already contains name, distance, direction
-            }
+            if processed_frame.detected_objects:
+                memory.add_detected_objects(processed_frame.detected_objects)
             
-            # Send the normalized frame back to the client
-            await self.send_message(connection_id, normalized_frame)
+            if processed_frame.detected_texts:
+                memory.add_detected_texts(processed_frame.detected_texts)
+            
+            if processed_frame.raw_description:
+                memory.add_scene_description(processed_frame.raw_description)
         
         except Exception as e:
             logger.error(f"Error processing video frame: {str(e)}", exc_info=True)
-            error_message = {
-                "error": f"Error processing video frame: {str(e)}"
-            }
-            await self.send_message(connection_id, error_message)
+            await self.send_error(connection_id, f"Error processing video frame: {str(e)}")
+    
+    def current_frame(self, connection_id: str) -> ProcessedFrame:
+        """The connection's latest analyzed frame, or the empty frame if there's none recent enough"""
+        latest = self.latest_processed.get(connection_id)
+        if latest is None:
+            return EMPTY_FRAME
+        
+        analyzed_at, processed_frame = latest
+        if time.monotonic() - analyzed_at > self.agent_frame_max_age:
+            # Too old to describe what the camera sees now
+            del self.latest_processed[connection_id]
+            return EMPTY_FRAME
+        return processed_frame
     
     async def process_audio(self, connection_id: str, audio_data: bytes) -> None:
         """
@@ -134,36 +558,32 @@ class ConnectionManager:
                 logger.warning("No transcription produced")
                 return
             
-            logger.info(f"Transcribed: {transcription}")
-            
-            # Get the latest frame for context
-            current_frame = ProcessedFrame(
-                captions=[],
-                frame_id=str(uuid.uuid4())
-            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Transcribed: %s", transcription)
             
             # Process the query with the agent
             try:
                 response, voice_feedback = await self.agent_service.process_query(
                     transcription, 
-                    current_frame
+                    self.current_frame(connection_id),
+                    self.memories.get(connection_id)
                 )
                 
                 # Create timestamp for response
-                timestamp = datetime.now().timestamp()
+                timestamp = time.time()
                 
                 # Send the response text back to the client with the expected structure
                 response_message = {
                     "captions": [
                         {
-                            "id": str(uuid.uuid4()),
+                            "id": self.next_id(connection_id),
                             "text": transcription,
                             "type": "audio",
                             "priority": "medium",
                             "timestamp": timestamp
                         }
                     ],
-                    "voiceFeedback": voice_feedback.model_dump() if voice_feedback and hasattr(voice_feedback, 'model_dump') else {
+                    "voiceFeedback": voice_feedback if isinstance(voice_feedback, BaseModel) else {
                         "text": str(response),
                         "priority": "medium",
                         "timestamp": timestamp
@@ -173,36 +593,18 @@ class ConnectionManager:
                 
                 await self.send_message(connection_id, response_message)
                 
+                # The client mutes its own speech for replies, so the answer is always streamed
+                await self.stream_speech(connection_id, str(response))
+                
             except Exception as e:
                 logger.error(f"Error processing query: {str(e)}", exc_info=True)
                 # Send a fallback response with the expected structure
-                timestamp = datetime.now().timestamp()
-                error_message = {
-                    "captions": [
-                        {
-                            "id": str(uuid.uuid4()),
-                            "text": transcription, 
-                            "type": "audio",
-                            "priority": "medium",
-                            "timestamp": timestamp
-                        }
-                    ],
-                    "voiceFeedback": {
-                        "text": f"I heard you say '{transcription}', but I'm having trouble processing your request right now. Please try again in a moment.",
-                        "priority": "high",
-                        "timestamp": timestamp
-                    },
-                    "objects": []  # Include empty objects array to match expected structure
-                }
-                await self.send_message(connection_id, error_message)
+                await self._send_query_fallback(connection_id, transcription)
                 
         except Exception as e:
             logger.error(f"Error processing audio: {str(e)}")
-            error_message = {
-                "error": f"Error processing audio: {str(e)}"
-            }
             try:
-                await self.send_message(connection_id, error_message)
+                await self.send_error(connection_id, f"Error processing audio: {str(e)}")
             except Exception as send_error:
                 logger.error(f"Error sending error message: {str(send_error)}")
     
@@ -212,46 +614,174 @@ class ConnectionManager:
         """
         try:
             # Process the message with the agent
-            current_frame = ProcessedFrame(
-                captions=[],
-                frame_id=str(uuid.uuid4())
-            )
-            
             response, voice_feedback = await self.agent_service.process_query(
                 message, 
-                current_frame
+                self.current_frame(connection_id),
+                self.memories.get(connection_id)
             )
             
             # Send the response text back to the client
             response_message = {
                 "captions": [
                     {
-                        "id": str(uuid.uuid4()),
+                        "id": self.next_id(connection_id),
                         "text": message,
                         "type": "audio",
                         "priority": "medium",
                         "timestamp": voice_feedback.timestamp
                     }
                 ],
-                "voiceFeedback": voice_feedback.model_dump() if voice_feedback else None
+                "voiceFeedback": voice_feedback
             }
             
             await self.send_message(connection_id, response_message)
             
-            # Generate and stream speech response
-            speech_data = await self.speech_service.text_to_speech(response)
-            logger.info(f"Generated {len(speech_data)} bytes of speech data")
+            # Stream the speech response to the client as it is generated
+            await self.stream_speech(connection_id, response)
             
         except Exception as e:
             logger.error(f"Error handling user message: {str(e)}")
-            error_message = {
-                "error": f"Error handling user message: {str(e)}"
+            await self.send_error(connection_id, f"Error handling user message: {str(e)}")
+    
+    async def send_error(self, connection_id: str, error: str) -> None:
+        """Send an error envelope to a client"""
+        if connection_id in self.msgpack_connections:
+            await self.send_message(connection_id, {"error": error})
+        else:
+            await self.send_bytes(connection_id, _ERROR_PREFIX + orjson.dumps(error) + b"}")
+    
+    async def _send_query_fallback(self, connection_id: str, transcription: str) -> None:
+        """Tell the client its transcribed query couldn't be answered, in text and streamed speech"""
+        caption_id = self.next_id(connection_id)
+        timestamp = time.time()
+        fallback_text = _QUERY_FALLBACK_TEXT.format(transcription=transcription)
+        
+        if connection_id in self.msgpack_connections:
+            caption = {
+                **_QUERY_FALLBACK_MESSAGE["captions"][0],
+                "id": caption_id,
+                "text": transcription,
+                "timestamp": timestamp
             }
-            await self.send_message(connection_id, error_message)
+            voice_feedback = {
+                **_QUERY_FALLBACK_MESSAGE["voiceFeedback"],
+                "text": fallback_text,
+                "timestamp": timestamp
+            }
+            message = {**_QUERY_FALLBACK_MESSAGE, "captions": [caption], "voiceFeedback": voice_feedback}
+            await self.send_message(connection_id, message)
+        else:
+            payload = (
+                _QUERY_FALLBACK_TEMPLATE
+                .replace(b'"__ID__"', orjson.dumps(caption_id))
+                .replace(b'"__TS__"', orjson.dumps(timestamp))
+                # User text goes in last so it is never searched for placeholders
+                .replace(b'"__FALLBACK__"', orjson.dumps(fallback_text))
+                .replace(b'"__TEXT__"', orjson.dumps(transcription))
+            )
+            await self.send_bytes(connection_id, payload)
+        
+        # Like any reply, the fallback carries an audio caption, so the client expects it as streamed speech
+        await self.stream_speech(connection_id, fallback_text)
 
 # Initialize the connection manager
 connection_manager = ConnectionManager()
 
+_WELCOME_MESSAGE = {
+    "captions": [
+        {
+            "id": "__ID__",
+            "text": "Connected to NeuroLens. Ready to assist you!",
+            "type": "visual",
+            "priority": "high",
+            "timestamp": "__TS__"
+        }
+    ],
+    "voiceFeedback": None,
+    "objects": []  # Empty objects array to match expected structure
+}
+
+# The JSON welcome message is serialized once; only its id and timestamp change per connection
+_WELCOME_TEMPLATE = orjson.dumps(_WELCOME_MESSAGE)
+
+def _welcome_bytes(connection_id: str) -> bytes:
+    """Fill in the volatile fields of the welcome message, in the client's format"""
+    caption_id = connection_manager.next_id(connection_id)
+    timestamp = time.time()
+    
+    if connection_manager.uses_msgpack(connection_id):
+        caption = {**_WELCOME_MESSAGE["captions"][0], "id": caption_id, "timestamp": timestamp}
+        return _packb({**_WELCOME_MESSAGE, "captions": [caption]})
+    
+    return (
+        _WELCOME_TEMPLATE
+        .replace(b'"__ID__"', orjson.dumps(caption_id))
+        .replace(b'"__TS__"', orjson.dumps(timestamp))
+    )
+
+async def _handle_text(connection_id: str, data: Dict[str, Any]) -> None:
+    """User sent a text message"""
+    text_content = data.get("content", "")
+    if text_content:
+        await connection_manager.enqueue(connection_id, "message", text_content)
+
+async def _handle_frame(connection_id: str, data: Dict[str, Any]) -> None:
+    """
+    Video inside a control message: raw bytes over msgpack, or
+    base64 over JSON (deprecated, sent by older clients)
+    """
+    frame_data = data.get("data", {})
+    video = frame_data.get("video", b"")
+    
+    # Nothing to analyze; don't let an empty frame displace a real one waiting to be processed
+    if not video:
+        return
+    
+    # Only JSON payloads need base64 decoding
+    if isinstance(video, str):
+        video = pybase64.b64decode(video, validate=False)
+    
+    # Process the video frame (ignore audio for simplicity in this example)
+    connection_manager.submit_frame(connection_id, video)
+
+async def _handle_audio(connection_id: str, data: Dict[str, Any]) -> None:
+    """
+    Audio inside a control message: raw bytes over msgpack, or
+    base64 over JSON (deprecated, sent by older clients)
+    """
+    audio_data = data.get("data", {})
+    audio = audio_data.get("audio", b"")
+    
+    if audio:
+        # Only JSON payloads need base64 decoding
+        if isinstance(audio, str):
+            audio = pybase64.b64decode(audio, validate=False)
+        
+        # Process the audio
+        await connection_manager.enqueue(connection_id, "audio", audio)
+
+async def _handle_settings(connection_id: str, data: Dict[str, Any]) -> None:
+    """User updated settings"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Received settings update: %s", data)
+
+# Control messages (JSON, or msgpack when negotiated), dispatched on their "type" field
+_CONTROL_HANDLERS: Dict[str, Callable[[str, Dict[str, Any]], Awaitable[None]]] = {
+    "message": _handle_text,
+    "frame": _handle_frame,
+    "audio": _handle_audio,
+    "settings": _handle_settings,
+}
+
+async def _dispatch_control(connection_id: str, data: Any) -> None:
+    """Route a decoded control message to its handler"""
+    if not isinstance(data, dict):
+        return
+    
+    handler = _CONTROL_HANDLERS.get(data.get("type"))
+    if handler:
+        await handler(connection_id, data)
+
 async def websocket_endpoint(websocket: WebSocket):
     """
     WebSocket endpoint for real-time communication
@@ -259,115 +789,87 @@ async def websocket_endpoint(websocket: WebSocket):
     connection_id = await connection_manager.connect(websocket)
     
     try:
-        logger.info(f"New WebSocket connection established: {connection_id}")
-        
-        # Send a welcome message - make sure it matches the expected frontend structure
-        welcome_message = {
-            "captions": [
-                {
-                    "id": str(uuid.uuid4()),
-                    "text": "Connected to NeuroLens. Ready to assist you!",
-                    "type": "visual",
-                    "priority": "high",
-                    "timestamp": datetime.now().timestamp()
-                }
-            ],
-            "voiceFeedback": None,
-            "objects": []  # Empty objects array to match expected structure
-        }
-        await connection_manager.send_message(connection_id, welcome_message)
-        
-        # Process incoming messages
-        while True:
-            # Wait for the next message
-            message = await websocket.receive()
-            
-            # Check the message type
-            if "text" in message:
-                # Process text message as JSON
-                try:
-                    data = json.loads(message["text"])
-                    message_type = data.get("type", "")
-                    
-                    if message_type == "message":
-                        # User sent a text message
-                        text_content = data.get("content", "")
-                        if text_content:
-                            # Process the message in a separate task
-                            task = asyncio.create_task(
-                                connection_manager.handle_user_message(connection_id, text_content)
-                            )
-                            connection_manager.tasks[connection_id] = task
-                    
-                    elif message_type == "frame":
-                        # Process frame data from JSON with base64 encoded video/audio
-                        frame_data = data.get("data", {})
-                        
-                        # Convert base64 to bytes
-                        video_base64 = frame_data.get("video", "")
-                        audio_base64 = frame_data.get("audio", "")
-                        timestamp = frame_data.get("timestamp", 0)
-                        
-                        # Decode base64 data
-                        video_bytes = base64.b64decode(video_base64) if video_base64 else b""
-                        
-                        # Process the video frame (ignore audio for simplicity in this example)
-                        task = asyncio.create_task(
-                            connection_manager.process_video_frame(connection_id, video_bytes)
-                        )
-                        connection_manager.tasks[connection_id] = task
-                    
-                    elif message_type == "audio":
-                        # Process audio-only data
-                        audio_data = data.get("data", {})
-                        audio_base64 = audio_data.get("audio", "")
-                        timestamp = audio_data.get("timestamp", 0)
-                        
-                        if audio_base64:
-                            # Decode the base64 audio
-                            audio_bytes = base64.b64decode(audio_base64)
-                            
-                            # Process the audio
-                            task = asyncio.create_task(
-                                connection_manager.process_audio(connection_id, audio_bytes)
-                            )
-                            connection_manager.tasks[connection_id] = task
-                    
-                    elif message_type == "settings":
-                        # User updated settings
-                        logger.info(f"Received settings update: {data}")
-                        
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON: {message['text']}")
-            
-            elif "bytes" in message:
-                # For backward compatibility, still handle binary data if sent
-                logger.warning("Received binary data directly. Using base64 JSON is preferred.")
-                data_type = message.get("type", "")
+        # The connection's workers live in this task group, so leaving it for any
+        # reason cancels everything still running for the connection
+        async with anyio.create_task_group() as task_group:
+            connection_manager.start_workers(task_group, connection_id)
+            try:
+                logger.info(f"New WebSocket connection established: {connection_id}")
                 
-                if data_type == "video":
-                    # Process video frame
-                    frame_data = message["bytes"]
-                    task = asyncio.create_task(
-                        connection_manager.process_video_frame(connection_id, frame_data)
-                    )
-                    connection_manager.tasks[connection_id] = task
+                # Send a welcome message - make sure it matches the expected frontend structure
+                await connection_manager.send_bytes(connection_id, _welcome_bytes(connection_id))
                 
-                elif data_type == "audio":
-                    # Process audio
-                    audio_data = message["bytes"]
-                    task = asyncio.create_task(
-                        connection_manager.process_audio(connection_id, audio_data)
-                    )
-                    connection_manager.tasks[connection_id] = task
+                await _receive_loop(websocket, connection_id)
             
-            else:
-                logger.warning(f"Unknown message format: {message}")
-    
-    except WebSocketDisconnect:
-        logger.info(f"WebSocket disconnected: {connection_id}")
-    except Exception as e:
-        logger.error(f"WebSocket error: {str(e)}")
+            except WebSocketDisconnect:
+                logger.info(f"WebSocket disconnected: {connection_id}")
+            except Exception as e:
+                logger.error(f"WebSocket error: {str(e)}")
+            finally:
+                task_group.cancel_scope.cancel()
     finally:
         # Clean up when the connection is closed
-        await connection_manager.disconnect(connection_id)
\ No newline at end of file
+        await connection_manager.disconnect(connection_id)
+
+async def _receive_loop(websocket: WebSocket, connection_id: str) -> None:
+    """Read messages from a client and hand them to the connection's workers"""
+    while True:
+        # Wait for the next message
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+        
+        # Binary messages carry raw media: a 1-byte type prefix followed by the payload.
+        # On msgpack connections they can also be packed control messages.
+        if message.get("bytes") is not None:
+            raw = message["bytes"]
+            if not raw:
+                continue
+            
+            # The server's ws_max_size depends on how it was launched, so the cap is enforced here too
+            if len(raw) > _MAX_MESSAGE_SIZE:
+                logger.warning(f"Closing {connection_id}: {len(raw)} byte message exceeds the size limit")
+                await websocket.close(code=status.WS_1009_MESSAGE_TOO_BIG)
+                raise WebSocketDisconnect(status.WS_1009_MESSAGE_TOO_BIG)
+            
+            kind = raw[0]
+            
+            # Media messages with nothing after the prefix carry no work
+            if kind in (BINARY_VIDEO, BINARY_AUDIO) and len(raw) == 1:
+                continue
+            
+            if kind == BINARY_VIDEO:
+                # A view past the prefix byte, so the frame isn't copied before decoding
+                connection_manager.submit_frame(connection_id, memoryview(raw)[1:])
+            elif kind == BINARY_AUDIO:
+                await connection_manager.enqueue(connection_id, "audio", raw[1:])
+            elif connection_manager.uses_msgpack(connection_id):
+                # Anything else on a msgpack connection is a packed control message
+                try:
+                    data = msgpack.unpackb(raw, raw=False)
+                except (msgpack.UnpackException, ValueError):
+                    logger.error(f"Invalid msgpack message from {connection_id}")
+                    continue
+                
+                await _dispatch_control(connection_id, data)
+            else:
+                logger.warning(f"Unknown binary message type: {kind}")
+        
+        elif message.get("text") is not None:
+            # Text messages are JSON control messages; control messages are small,
+            # so refuse to parse anything large on the event loop
+            text = message["text"]
+            if len(text) > _MAX_TEXT_SIZE:
+                logger.warning(f"Ignoring oversized text message ({len(text)} chars) from {connection_id}")
+                continue
+            
+            try:
+                data = orjson.loads(text)
+            except orjson.JSONDecodeError:
+                logger.error(f"Invalid JSON: {text[:200]}")
+                continue
+            
+            await _dispatch_control(connection_id, data)
+        
+        else:
+            logger.warning(f"Unknown message format: {message}")
@@ -10,18 +10,45 @@ class Settings(BaseSettings):
     # API keys
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     
+    # OpenAI connection pool, shared by all services
+    OPENAI_MAX_CONNECTIONS: int = 256
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 128
+    OPENAI_KEEPALIVE_EXPIRY: float = 60.0  # seconds an idle connection is kept for reuse
+    OPENAI_TIMEOUT: float = 30.0  # seconds
+    OPENAI_MAX_RETRIES: int = 3  # retries on rate limits, 5xx and connection errors, with exponential backoff
+    
     # Application settings
     APP_NAME: str = "NeuroLens Backend"
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
+    # Worker processes when run via `python -m app.main`; 1 keeps the auto-reloader for development.
+    # Each worker loads its own models, and a WebSocket stays on the worker that accepted it.
+    WEB_CONCURRENCY: int = 1
     
     # WebSocket settings
     WS_PING_INTERVAL: int = 30  # seconds
+    WS_QUEUE_SIZE: int = 2  # pending audio/text jobs per connection before new ones are rejected
+    WS_SEND_QUEUE_SIZE: int = 32  # outgoing messages buffered per connection before it is dropped as too slow
+    WS_SEND_TIMEOUT: float = 5.0  # seconds a single send may take before the client is dropped
+    WS_MAX_MESSAGE_SIZE: int = 4 * 1024 * 1024  # bytes; larger frames are rejected by the server
+    WS_MAX_TEXT_SIZE: int = 1024 * 1024  # characters; larger JSON messages are ignored before parsing
     
     # Vision settings
     VISION_MODEL: str = "gpt-4o-mini"
     DETECTION_CONFIDENCE_THRESHOLD: float = 0.4  # Slightly lower threshold for YOLO
     VISION_MAX_TOKENS: int = 1000
+    FRAME_MAX_SIZE: int = 640  # Decoded frames are downscaled to this maximum dimension (the YOLO input size)
+    VISION_IMAGE_MAX_SIZE: int = 768  # Frames are downscaled to this maximum dimension before upload
+    VISION_JPEG_QUALITY: int = 80
+    VISION_IMAGE_DETAIL: str = "low"  # "low" is a single 512px tile, so larger uploads are wasted
     YOLO_MODEL_PATH: Optional[str] = None  # If None, will download from ultralytics
+    YOLO_TENSORRT: bool = True  # Export and use a TensorRT FP16 engine when a CUDA GPU is available
+    MAX_BATCH: int = 8  # Max frames per batched vision call
+    BATCH_WINDOW_MS: int = 15  # How long to wait for other connections' frames before running a batch
+    FRAME_CACHE_SIZE: int = 128  # Processed frames remembered by content hash
+    SCENE_CACHE_SIZE: int = 256  # Scene descriptions remembered by image hash
+    SCENE_CACHE_TTL: float = 60.0  # Seconds a cached scene description stays valid
+    SCENE_HASH_DISTANCE: int = 5  # Max differing bits between 64-bit average hashes of the "same" scene
+    UPLOAD_IMAGE_MAX_SIZE: int = 800  # Uploaded images are resized to this maximum dimension
     
     # Speech settings
     STT_MODEL: str = "gpt-4o-mini-transcribe"
@@ -32,13 +59,22 @@ class Settings(BaseSettings):
     AGENT_MODEL: str = "gpt-4o-mini"
     AGENT_TEMPERATURE: float = 0.7
     AGENT_MAX_TOKENS: int = 1500
+    AGENT_FRAME_MAX_AGE: float = 5.0  # seconds a connection's last analyzed frame is used as the agent's view
     
     # Memory settings
     MEMORY_MAX_MESSAGES: int = 20
+    MEMORY_PROMPT_MESSAGES: int = 10  # Most recent messages sent to the model when answering from memory
+    MEMORY_MAX_TRACKED: int = 2000  # Objects and texts remembered per session, on top of the 5 minute expiry
+    MEMORY_EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"  # sentence-transformers model for semantic search
+    MEMORY_BATCH_SIZE: int = 1000  # Offline memory questions queued before they are submitted as a batch
+    MEMORY_BATCH_MAX_AGE: float = 300.0  # Seconds the oldest queued question waits before a smaller batch is submitted
+    MEMORY_BATCH_POLL_INTERVAL: float = 60.0  # Seconds between status checks while waiting for a batch
     
     # Additional component settings
     ENABLE_OCR: bool = True
     OCR_CONFIDENCE_THRESHOLD: float = 70.0
+    OCR_MAX_REGIONS: int = 8  # Above this many candidate text regions, OCR reads the whole frame instead
+    OCR_WORKERS: int = 4  # Concurrent Tesseract processes
     
     # Security
     CORS_ORIGINS: list[str] = ["http://localhost:3000"]
@@ -47,4 +83,5 @@ class Settings(BaseSettings):
         env_file = ".env"
         env_file_encoding = "utf-8"
 
-settings = Settings()
\ No newline at end of file
+# Parsed once at import; every module shares this instance
+settings = Settings()
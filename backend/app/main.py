@@ -1,24 +1,45 @@
 import os
+import asyncio
 import logging
+import logging.handlers
+import queue
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 
 from app.config import settings
 from app.api.router import router
 from app.api.ws import websocket_endpoint
+from app.services.registry import decode_pool, close_services, get_agent_service
 
 # Set up logging
+# Records go through a queue so formatting and writes happen on a listener thread, not the event loop
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.handlers.QueueHandler(_log_queue)],
 )
 
 logger = logging.getLogger(__name__)
 
-# Initialize the OpenAI client and agents
-from agents import set_default_openai_key
-set_default_openai_key(settings.OPENAI_API_KEY)
+# Use uvloop for any event loop created in this process (it isn't available on Windows).
+# uvicorn picks its own loop from its settings; this covers other ways of starting the app.
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    logger.info("uvloop not installed, using the default asyncio event loop")
+
+# Initialize the OpenAI client and agents; the agent runner shares the services' connection pool
+from agents import set_default_openai_client
+from app.services.openai_client import get_async_openai_client, close_openai_clients
+set_default_openai_client(get_async_openai_client())
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -32,15 +53,35 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"Could not create models directory: {str(e)}")
     
+    # Build the YOLO TensorRT engine before serving, if enabled and missing. The export takes
+    # minutes, so it runs in a worker thread rather than when the first frame arrives
+    if settings.YOLO_TENSORRT:
+        def _build_engine() -> None:
+            from app.services.vision_service import build_tensorrt_engine
+            build_tensorrt_engine()
+        await asyncio.to_thread(_build_engine)
+    
     yield
     
     # Shutdown: Clean up resources
     logger.info("Shutting down NeuroLens backend server...")
+    decode_pool.shutdown(wait=False, cancel_futures=True)
+    close_services()
+    # Queued batch questions are submitted while the OpenAI client is still open
+    if get_agent_service.created():
+        try:
+            await get_agent_service().close()
+        except Exception as e:
+            logger.error(f"Could not submit queued memory questions: {str(e)}")
+    await close_openai_clients()
+    _log_listener.stop()
 
 # Create FastAPI app
+# HTTP responses are encoded with orjson, like the WebSocket messages
 app = FastAPI(
     title=settings.APP_NAME,
     debug=settings.DEBUG,
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -74,7 +115,24 @@ async def health_check():
     return {"status": "healthy"}
 
 # Run with:
-# uvicorn app.main:app --reload
+# uvicorn app.main:app --reload --loop uvloop --http httptools --ws-max-size 4194304
+# In production, one worker per core:
+# uvicorn app.main:app --workers $WEB_CONCURRENCY --loop uvloop --http httptools --ws-max-size 4194304
+# (--ws-max-size matches WS_MAX_MESSAGE_SIZE, so oversized messages are refused before they are buffered)
 if __name__ == "__main__":
+    import sys
     import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    
+    # uvloop and httptools come with uvicorn[standard]; uvloop is not available on Windows.
+    # The reloader only supports a single worker, so it's on only when WEB_CONCURRENCY is 1
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=settings.WEB_CONCURRENCY == 1,
+        workers=settings.WEB_CONCURRENCY,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_max_size=settings.WS_MAX_MESSAGE_SIZE,
+    )
\ No newline at end of file
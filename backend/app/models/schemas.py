@@ -1,7 +1,7 @@
+import time
 from enum import Enum
 from typing import List, Optional, Dict, Any, Union
-from pydantic import BaseModel, Field
-from datetime import datetime
+from pydantic import BaseModel, Field, computed_field
 
 
 class MessageRole(str, Enum):
@@ -18,6 +18,13 @@ class DetectedObject(BaseModel):
     direction: Optional[str] = None  # Relative direction (left, right, center)
 
 
+class SceneObject(BaseModel):
+    """Simplified view of a DetectedObject, as sent to the client"""
+    name: str
+    distance: float = 0
+    direction: str = "center"
+
+
 class DetectedText(BaseModel):
     text: str
     confidence: float
@@ -41,24 +48,39 @@ class Caption(BaseModel):
     id: str
     text: str
     type: CaptionType
-    timestamp: float = Field(default_factory=lambda: datetime.now().timestamp())
+    timestamp: float = Field(default_factory=time.time)
     priority: CaptionPriority = CaptionPriority.MEDIUM
 
 
 class VoiceFeedback(BaseModel):
     text: str
     priority: CaptionPriority = CaptionPriority.MEDIUM
-    timestamp: float = Field(default_factory=lambda: datetime.now().timestamp())
+    timestamp: float = Field(default_factory=time.time)
 
 
 class ProcessedFrame(BaseModel):
     captions: List[Caption] = []
     voiceFeedback: Optional[VoiceFeedback] = None
-    objects: List[dict] = []
     raw_description: Optional[str] = None
     detected_texts: List[DetectedText] = []
     detected_objects: List[DetectedObject] = []
     frame_id: Optional[str] = None
+    # Set on results reused for a skipped frame, which were computed for an earlier frame; never serialized
+    skipped: bool = Field(default=False, exclude=True)
+    
+    @computed_field
+    @property
+    def objects(self) -> List[SceneObject]:
+        """Client-facing summary of detected_objects, built only when the frame is serialized"""
+        return [SceneObject.model_construct(
+            name=obj.name,
+            distance=obj.distance if obj.distance else 0,
+            direction=obj.direction if obj.direction else "center"
+        ) for obj in self.detected_objects]
+
+
+# Shared frame for queries that have no camera context; never mutated
+EMPTY_FRAME = ProcessedFrame(captions=[], frame_id="empty")
 
 
 class WebcamSettings(BaseModel):
@@ -85,7 +107,16 @@ class UserSettings(BaseModel):
 class Message(BaseModel):
     role: MessageRole
     content: str
-    timestamp: float = Field(default_factory=lambda: datetime.now().timestamp())
+    timestamp: float = Field(default_factory=time.time)
+
+
+class BatchAnswers(BaseModel):
+    """State of a batch of memory questions sent through the OpenAI Batch API"""
+    status: str  # The batch's status as reported by OpenAI
+    finished: bool = False  # True once the batch is completed, failed, expired or cancelled
+    answers: Dict[str, str] = {}  # Answer text by request ID
+    errors: Dict[str, str] = {}  # Error message by request ID, for requests that failed
+    batch_errors: List[str] = []  # Errors for the batch as a whole, e.g. why it failed validation
 
 
 class ConversationContext(BaseModel):
@@ -1,13 +1,17 @@
 import asyncio
+import heapq
+import itertools
 import logging
+import re
 import uuid
 from typing import Any, Dict, List, Optional, Tuple
 import json
-from openai import OpenAI
+import orjson
 
 from agents import Agent, Runner, function_tool, RunContextWrapper, trace, ModelSettings
 
 from app.config import settings
+from app.services.openai_client import get_async_openai_client
 from app.models.schemas import (
     Caption,
     CaptionPriority,
@@ -18,21 +22,25 @@ from app.models.schemas import (
     Message,
     MessageRole,
     ProcessedFrame,
-    VoiceFeedback
+    VoiceFeedback,
+    BatchAnswers
 )
-from app.services.vision_service import VisionService
-from app.services.speech_service import SpeechService
 from app.services.memory_service import MemoryService
+from app.services.registry import get_memory_service
 
 logger = logging.getLogger(__name__)
 
+# Words in a scene description that suggest currency is visible, matched in a single pass
+_CURRENCY_PATTERN = re.compile(
+    "|".join(["dollar", "euro", "pound", "yen", "rupee", "bill", "coin", "note", "cash", "money"]),
+    re.IGNORECASE
+)
+
 class AgentContext:
-    """Context object passed to agent tools"""
-    def __init__(self):
+    """Context object passed to agent tools, created for each query"""
+    def __init__(self, memory: MemoryService):
         self.current_frame: Optional[ProcessedFrame] = None
-        self.memory: MemoryService = MemoryService()
-        self.vision: VisionService = VisionService()
-        self.speech: SpeechService = SpeechService()
+        self.memory: MemoryService = memory
         self.last_query: Optional[str] = None
         self.user_settings: Dict[str, Any] = {
             "voice_enabled": True,
@@ -51,13 +59,28 @@ class AgentContext:
 
 class AgentService:
     def __init__(self):
-        self.agent_context = AgentContext()
-        self.vision_service = VisionService()
-        self.speech_service = SpeechService()
-        self.memory_service = MemoryService()
-        
         # Set up the agent with tools
         self.assistant_agent = self._create_assistant_agent()
+        # Batch API path for offline memory questions, created on first use
+        self._batch_answerer: Optional["BatchMemoryAnswerer"] = None
+    
+    @property
+    def batch_answerer(self) -> "BatchMemoryAnswerer":
+        if self._batch_answerer is None:
+            self._batch_answerer = BatchMemoryAnswerer()
+        return self._batch_answerer
+    
+    async def queue_batch_memory_question(self, question: str, conversation_text: str) -> str:
+        """
+        Queue a memory question to be answered through the Batch API, for non-interactive work,
+        and return its request ID. Collect answers with batch_answerer.wait(batch_answerer.batch_ids[request_id])
+        """
+        return await self.batch_answerer.queue_question(question, conversation_text)
+    
+    async def close(self) -> None:
+        """Submit memory questions still queued for the Batch API"""
+        if self._batch_answerer is not None:
+            await self._batch_answerer.close()
     
     def _create_assistant_agent(self) -> Agent:
         """Create the assistant agent with all necessary tools"""
@@ -84,6 +107,9 @@ class AgentService:
             When users hold up documents, cards, or other items with text, you can help read the content while maintaining privacy.
             Provide spatial guidance using terms like "in front of you", "to your left/right", etc.
             
+            To learn about the scene, call _analyze_current_scene once; it returns the scene description,
+            objects, readable text and hazards together. Use only the parts relevant to the user's query.
+            
             Some common user needs include:
             - Reading text (mail, documents, labels, etc.)
             - Identifying objects and their locations
@@ -93,28 +119,35 @@ class AgentService:
             - Describing environment or people
             """,
             tools=[
-                self._describe_current_scene,
-                self._identify_objects,
-                self._read_text_in_scene,
-                self._check_for_hazards,
+                # One tool returns the description, objects, text and hazards together, so
+                # answering about the scene takes a single tool call instead of up to four
+                self._analyze_current_scene,
                 self._identify_currency,
                 self._answer_from_memory
             ],
             model=settings.AGENT_MODEL,
-            model_settings=ModelSettings(temperature=settings.AGENT_TEMPERATURE)  # Use ModelSettings class instead of a dictionary
+            model_settings=ModelSettings(
+                temperature=settings.AGENT_TEMPERATURE,
+                # Let the model request several tools in one turn; the runner executes them concurrently
+                parallel_tool_calls=True
+            )
         )
     
-    async def process_query(self, query: str, current_frame: ProcessedFrame) -> Tuple[str, VoiceFeedback]:
+    async def process_query(
+        self,
+        query: str,
+        current_frame: ProcessedFrame,
+        memory: Optional[MemoryService] = None
+    ) -> Tuple[str, VoiceFeedback]:
         """Process a user query and return a response"""
-        # Update the agent context with the latest frame
-        self.agent_context.update_frame(current_frame)
-        self.agent_context.last_query = query
+        # A fresh context per query, so concurrent queries can't overwrite each other's frame.
+        # WebSocket connections pass their own memory; the HTTP API has no session and uses the shared one
+        context = AgentContext(memory if memory is not None else get_memory_service())
+        context.update_frame(current_frame)
+        context.last_query = query
         
         # Add the user message to memory
-        self.agent_context.add_message(MessageRole.USER, query)
-        
-        # Get the previous conversation context
-        context = self.agent_context
+        context.add_message(MessageRole.USER, query)
         
         # Create a trace for this interaction
         with trace(workflow_name="NeuroLens Vision Assistant"):
@@ -129,7 +162,7 @@ class AgentService:
         response = result.final_output
         
         # Add the assistant response to memory
-        self.agent_context.add_message(MessageRole.ASSISTANT, response)
+        context.add_message(MessageRole.ASSISTANT, response)
         
         # Create a voice feedback object
         voice_feedback = VoiceFeedback(
@@ -141,119 +174,98 @@ class AgentService:
     
     @staticmethod
     @function_tool
-    async def _describe_current_scene(ctx: RunContextWrapper[AgentContext]) -> str:
+    async def _analyze_current_scene(ctx: RunContextWrapper[AgentContext]) -> str:
         """
-        Describe the current scene in detail, focusing on the overall environment.
+        Describe the current scene and list the key objects, readable text (excluding sensitive
+        information) and potential hazards or obstacles in it.
         """
         try:
             context = ctx.context
             if not context.current_frame:
                 return "I don't have access to the camera feed right now."
             
-            scene_description = context.current_frame.raw_description
-            if not scene_description:
-                return "I'm unable to clearly describe what I see right now."
-            
-            return scene_description
+            frame = context.current_frame
+            sections = [
+                AgentService._describe_scene(frame),
+                AgentService._list_objects(frame),
+                AgentService._read_texts(frame),
+                AgentService._list_hazards(frame),
+            ]
+            return "\n\n".join(sections)
         except Exception as e:
-            logger.error(f"Error describing scene: {str(e)}")
+            logger.error(f"Error analyzing scene: {str(e)}")
             return "I'm having trouble processing the visual information at the moment."
     
     @staticmethod
-    @function_tool
-    async def _identify_objects(ctx: RunContextWrapper[AgentContext]) -> str:
-        """
-        Identify and list the key objects visible in the current scene.
-        """
-        try:
-            context = ctx.context
-            if not context.current_frame:
-                return "I don't have access to the camera feed right now."
-            
-            objects = context.current_frame.detected_objects
-            if not objects:
-                return "I don't see any clearly identifiable objects at the moment."
-            
-            # Sort objects by distance
-            sorted_objects = sorted(objects, key=lambda obj: obj.distance if obj.distance else float('inf'))
-            
-            # Format the response
-            result = "Here are the objects I can see:\n"
-            for obj in sorted_objects[:5]:  # Limit to top 5 objects
-                distance_str = f"about {obj.distance:.1f} meters away" if obj.distance else "at an unknown distance"
-                direction = f"to your {obj.direction}" if obj.direction else ""
-                result += f"- {obj.name} {distance_str} {direction}\n"
-            
-            return result
-        except Exception as e:
-            logger.error(f"Error identifying objects: {str(e)}")
-            return "I'm having trouble identifying objects at the moment."
+    def _describe_scene(frame: ProcessedFrame) -> str:
+        """Overall scene description section of _analyze_current_scene"""
+        scene_description = frame.raw_description
+        if not scene_description:
+            return "I'm unable to clearly describe what I see right now."
+        
+        return f"Scene: {scene_description}"
     
     @staticmethod
-    @function_tool
-    async def _read_text_in_scene(ctx: RunContextWrapper[AgentContext]) -> str:
-        """
-        Read and report any text visible in the current scene, excluding sensitive information.
-        """
-        try:
-            context = ctx.context
-            if not context.current_frame:
-                return "I don't have access to the camera feed right now."
-            
-            texts = context.current_frame.detected_texts
-            if not texts:
-                return "I don't see any readable text at the moment."
-            
-            # Filter out sensitive texts
-            non_sensitive_texts = [
-                txt for txt in texts 
-                if not (txt.is_sensitive or txt.is_card_number)
-            ]
-            
-            if not non_sensitive_texts:
-                return "I can see some text, but it appears to contain sensitive information that I shouldn't read aloud for privacy reasons."
-            
-            # Format the response
-            result = "Here's the text I can read:\n"
-            for i, txt in enumerate(non_sensitive_texts[:7]):  # Limit to 7 text items
-                result += f"{i+1}. {txt.text}\n"
-            
-            # Add a privacy notice if some texts were filtered out
-            if len(texts) > len(non_sensitive_texts):
-                result += "\nNote: Some text that appears to contain sensitive information was omitted for privacy."
-            
-            return result
-        except Exception as e:
-            logger.error(f"Error reading text: {str(e)}")
-            return "I'm having trouble reading text at the moment."
+    def _list_objects(frame: ProcessedFrame) -> str:
+        """Key objects section of _analyze_current_scene"""
+        objects = frame.detected_objects
+        if not objects:
+            return "I don't see any clearly identifiable objects at the moment."
+        
+        # The 5 closest objects, without sorting all of them
+        closest_objects = heapq.nsmallest(5, objects, key=lambda obj: obj.distance if obj.distance else float('inf'))
+        
+        # Format the response
+        result = "Here are the objects I can see:\n"
+        for obj in closest_objects:
+            distance_str = f"about {obj.distance:.1f} meters away" if obj.distance else "at an unknown distance"
+            direction = f"to your {obj.direction}" if obj.direction else ""
+            result += f"- {obj.name} {distance_str} {direction}\n"
+        
+        return result
     
     @staticmethod
-    @function_tool
-    async def _check_for_hazards(ctx: RunContextWrapper[AgentContext]) -> str:
-        """
-        Check for any potential hazards or obstacles in the current scene.
-        """
-        try:
-            context = ctx.context
-            if not context.current_frame:
-                return "I don't have access to the camera feed right now."
-            
-            # Check for nearby objects that might be hazards
-            objects = context.current_frame.detected_objects
-            nearby_objects = [obj for obj in objects if obj.distance and obj.distance < 1.5]
-            
-            if not nearby_objects:
-                return "I don't see any immediate hazards or obstacles in your vicinity."
-            
-            # Format the response
-            result = "Please be aware of these potential obstacles:\n"
-            for obj in nearby_objects:
-                result += f"- {obj.name} to your {obj.direction}, about {obj.distance:.1f} meters away\n"
-            
-            return result
-        except Exception as e:
-            logger.error(f"Error checking for hazards: {str(e)}")
-            return "I'm having trouble assessing potential hazards at the moment."
+    def _read_texts(frame: ProcessedFrame) -> str:
+        """Readable text section of _analyze_current_scene, with sensitive text left out"""
+        texts = frame.detected_texts
+        if not texts:
+            return "I don't see any readable text at the moment."
+        
+        # Filter out sensitive texts
+        non_sensitive_texts = [
+            txt for txt in texts 
+            if not (txt.is_sensitive or txt.is_card_number)
+        ]
+        
+        if not non_sensitive_texts:
+            return "I can see some text, but it appears to contain sensitive information that I shouldn't read aloud for privacy reasons."
+        
+        # Format the response
+        result = "Here's the text I can read:\n"
+        for i, txt in enumerate(non_sensitive_texts[:7]):  # Limit to 7 text items
+            result += f"{i+1}. {txt.text}\n"
+        
+        # Add a privacy notice if some texts were filtered out
+        if len(texts) > len(non_sensitive_texts):
+            result += "\nNote: Some text that appears to contain sensitive information was omitted for privacy."
+        
+        return result
+    
+    @staticmethod
+    def _list_hazards(frame: ProcessedFrame) -> str:
+        """Hazards and obstacles section of _analyze_current_scene"""
+        # Check for nearby objects that might be hazards
+        nearby_objects = [obj for obj in frame.detected_objects if obj.distance and obj.distance < 1.5]
+        
+        if not nearby_objects:
+            return "I don't see any immediate hazards or obstacles in your vicinity."
+        
+        # Format the response
+        result = "Please be aware of these potential obstacles:\n"
+        for obj in nearby_objects:
+            result += f"- {obj.name} to your {obj.direction}, about {obj.distance:.1f} meters away\n"
+        
+        return result
     
     @staticmethod
     @function_tool
@@ -281,10 +293,9 @@ class AgentService:
             
             # For currency detection, we would use the scene description
             # This is a simplified approach - a real implementation would use more sophisticated methods
-            scene_description = context.current_frame.raw_description.lower()
+            scene_description = context.current_frame.raw_description or ""
             
-            currency_keywords = ["dollar", "euro", "pound", "yen", "rupee", "bill", "coin", "note", "cash", "money"]
-            if any(keyword in scene_description for keyword in currency_keywords):
+            if _CURRENCY_PATTERN.search(scene_description):
                 return "I can see what might be currency in the image. For a more specific identification, please hold it closer to the camera and ask me to describe it in detail."
             
             return "I don't see any clear signs of currency or payment cards."
@@ -304,46 +315,181 @@ class AgentService:
         try:
             context = ctx.context
             
-            # Get the conversation history
-            conversation = context.memory.get_conversation_history()
-            
-            if not conversation:
+            # Get the conversation history, already rendered as text by the memory
+            if not context.memory.messages:
                 return "I don't have any previous conversation context to reference."
             
             # For a sophisticated implementation, you would use an embedding search or similar
             # Here we'll use a simple approach by querying GPT with the conversation history
+            conversation_text = context.memory.get_conversation_text()
             
-            # Prepare the conversation history as a string
-            conversation_text = "\n".join([
-                f"{msg.role}: {msg.content}" 
-                for msg in conversation
-            ])
-            
-            # Use the OpenAI client to generate a response based on memory
-            client = OpenAI(api_key=settings.OPENAI_API_KEY)
-            response = client.chat.completions.create(
-                model=settings.AGENT_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are an assistant with access to conversation history. "
-                            "Answer the user's question based only on information in the provided conversation history."
-                        )
-                    },
-                    {
-                        "role": "user",
-                        "content": (
-                            f"Based on this conversation history:\n\n{conversation_text}\n\n"
-                            f"Please answer this question: {question}"
-                        )
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=200
+            # Use the shared OpenAI client to generate a response based on memory
+            client = get_async_openai_client()
+            response = await client.chat.completions.create(
+                **AgentService._memory_answer_request(conversation_text, question)
             )
             
             return response.choices[0].message.content
         except Exception as e:
             logger.error(f"Error answering from memory: {str(e)}")
-            return "I'm having trouble recalling our previous conversation."
\ No newline at end of file
+            return "I'm having trouble recalling our previous conversation."
+    
+    @staticmethod
+    def _memory_answer_request(conversation_text: str, question: str) -> Dict[str, Any]:
+        """Chat completion parameters for answering a question from conversation history"""
+        return {
+            "model": settings.AGENT_MODEL,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": (
+                        "You are an assistant with access to conversation history. "
+                        "Answer the user's question based only on information in the provided conversation history."
+                    )
+                },
+                {
+                    "role": "user",
+                    "content": (
+                        f"Based on this conversation history:\n\n{conversation_text}\n\n"
+                        f"Please answer this question: {question}"
+                    )
+                }
+            ],
+            "temperature": 0.3,
+            "max_tokens": 200
+        }
+
+
+# Batch statuses after which nothing more will happen; everything else means it is still running
+_BATCH_FINISHED_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+class BatchMemoryAnswerer:
+    """
+    Answers memory questions through the OpenAI Batch API, at half the cost and with
+    separate rate limits, for offline work that can wait up to 24 hours (summaries,
+    regenerating answers). Interactive queries stay on AgentService.
+    
+    Queued questions are submitted once MEMORY_BATCH_SIZE of them are waiting or the oldest
+    has waited MEMORY_BATCH_MAX_AGE seconds; wait() then polls a batch until it finishes.
+    """
+    def __init__(self):
+        self.client = get_async_openai_client()
+        self.max_pending = settings.MEMORY_BATCH_SIZE
+        self.max_age = settings.MEMORY_BATCH_MAX_AGE
+        self.poll_interval = settings.MEMORY_BATCH_POLL_INTERVAL
+        self._pending: List[Dict[str, Any]] = []
+        # Submits the queued questions once the oldest is max_age old, started by the first one queued
+        self._flush_task: Optional[asyncio.Task] = None
+        # Batch ID each submitted question was sent in
+        self.batch_ids: Dict[str, str] = {}
+    
+    async def queue_question(self, question: str, conversation_text: str) -> str:
+        """
+        Add a question to the next batch and return the ID its answer will be filed under.
+        Submits the batch when it is full; look up its ID in batch_ids.
+        """
+        request_id = uuid.uuid4().hex
+        self._pending.append({
+            "custom_id": request_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": AgentService._memory_answer_request(conversation_text, question)
+        })
+        
+        if len(self._pending) >= self.max_pending:
+            await self.submit()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._submit_after(self.max_age))
+        return request_id
+    
+    async def _submit_after(self, delay: float) -> None:
+        """Submit whatever is queued once delay seconds have passed"""
+        await asyncio.sleep(delay)
+        # Cleared first so submit() doesn't cancel the task running it
+        self._flush_task = None
+        try:
+            await self.submit()
+        except Exception as e:
+            logger.error(f"Error submitting memory question batch: {str(e)}")
+    
+    async def submit(self) -> Optional[str]:
+        """Upload the queued questions as one batch and return its ID, or None if nothing is queued"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if not self._pending:
+            return None
+        
+        requests, self._pending = self._pending, []
+        try:
+            batch_input = b"\n".join(orjson.dumps(request) for request in requests)
+            input_file = await self.client.files.create(file=("memory_batch.jsonl", batch_input), purpose="batch")
+            batch = await self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+        except Exception:
+            # Keep the questions for the next attempt rather than losing them
+            self._pending = requests + self._pending
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._submit_after(self.max_age))
+            raise
+        
+        for request in requests:
+            self.batch_ids[request["custom_id"]] = batch.id
+        logger.info(f"Submitted {len(requests)} memory questions as batch {batch.id}")
+        return batch.id
+    
+    async def wait(self, batch_id: str) -> BatchAnswers:
+        """Poll a batch every poll_interval seconds until it finishes, and return its results"""
+        while True:
+            result = await self.collect(batch_id)
+            if result.finished:
+                return result
+            await asyncio.sleep(self.poll_interval)
+    
+    async def close(self) -> None:
+        """Submit anything still queued, so questions aren't lost on shutdown"""
+        await self.submit()
+    
+    async def collect(self, batch_id: str) -> BatchAnswers:
+        """
+        Return the batch's status and, once it has finished, its answers and errors by request ID.
+        Expired and cancelled batches can still have answers for the requests that completed.
+        """
+        batch = await self.client.batches.retrieve(batch_id)
+        if batch.status not in _BATCH_FINISHED_STATUSES:
+            return BatchAnswers(status=batch.status)
+        
+        result = BatchAnswers(status=batch.status, finished=True)
+        if batch.errors is not None and batch.errors.data:
+            result.batch_errors = [error.message or error.code or "unknown error" for error in batch.errors.data]
+        
+        # Successful requests go to the output file and failed ones to the error file
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id is None:
+                continue
+            output = await self.client.files.content(file_id)
+            for line in output.content.splitlines():
+                if line:
+                    self._read_result(orjson.loads(line), result)
+        
+        for request_id, error in result.errors.items():
+            logger.error(f"Batch memory question {request_id} failed: {error}")
+        for request_id in itertools.chain(result.answers, result.errors):
+            self.batch_ids.pop(request_id, None)
+        return result
+    
+    @staticmethod
+    def _read_result(line: Dict[str, Any], result: BatchAnswers) -> None:
+        """File one line of a batch output or error file under answers or errors"""
+        request_id = line.get("custom_id", "")
+        response = line.get("response") or {}
+        body = response.get("body") or {}
+        if response.get("status_code") == 200:
+            result.answers[request_id] = body["choices"][0]["message"]["content"]
+            return
+        
+        error = line.get("error") or body.get("error") or {}
+        result.errors[request_id] = error.get("message") or f"status {response.get('status_code')}"
@@ -1,9 +1,13 @@
+import itertools
+import threading
+import time
 import logging
-from typing import List, Dict, Any, Optional
-from datetime import datetime
-from collections import deque
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict, deque
+import numpy as np
 
 from app.config import settings
+from app.services.registry import get_embedding_model
 from app.models.schemas import ConversationContext, Message, MessageRole, DetectedObject, DetectedText
 
 logger = logging.getLogger(__name__)
@@ -13,9 +17,22 @@ class MemoryService:
     
     def __init__(self):
         self.max_messages = settings.MEMORY_MAX_MESSAGES
+        self.prompt_messages = settings.MEMORY_PROMPT_MESSAGES
+        self.max_tracked = settings.MEMORY_MAX_TRACKED
         self.messages = deque(maxlen=self.max_messages)
-        self.detected_objects_history = {}  # track objects seen over time
-        self.detected_texts_history = {}    # track texts seen over time
+        # Embedding of each message for semantic search, computed on first search and
+        # kept in step with self.messages (same maxlen, so both drop the oldest together)
+        self._embeddings = deque(maxlen=self.max_messages)
+        # Guards both deques: messages are added on the event loop while a search runs in a worker
+        # thread. Held only to snapshot or update them, never while encoding
+        self._messages_lock = threading.Lock()
+        # History rendered as prompt text, rebuilt only after the history changes
+        self._conversation_text: Optional[str] = None
+        # Objects and texts seen over time, ordered oldest-seen first: a sighting moves its
+        # entry to the end, so expiry only has to look at the front.
+        # Keyed by (name or text, x1, y1); hashing a tuple is much cheaper than formatting floats into a string
+        self.detected_objects_history: "OrderedDict[Tuple[str, float, float], Dict[str, Any]]" = OrderedDict()
+        self.detected_texts_history: "OrderedDict[Tuple[str, float, float], Dict[str, Any]]" = OrderedDict()
         self.scene_descriptions = deque(maxlen=5)  # keep last 5 scene descriptions
     
     def add_message(self, role: MessageRole, content: str) -> None:
@@ -23,55 +40,77 @@ class MemoryService:
         message = Message(
             role=role,
             content=content,
-            timestamp=datetime.now().timestamp()
+            timestamp=time.time()
         )
-        self.messages.append(message)
+        with self._messages_lock:
+            self.messages.append(message)
+            self._embeddings.append(None)
+        self._conversation_text = None
     
     def get_conversation_history(self) -> List[Message]:
         """Get the conversation history as a list of messages"""
         return list(self.messages)
     
+    def get_conversation_text(self) -> str:
+        """
+        Get the most recent messages as one "role: content" line each, for use in a prompt.
+        Older turns are left out to keep prompt tokens (and latency) down.
+        """
+        if self._conversation_text is None:
+            recent = itertools.islice(self.messages, max(0, len(self.messages) - self.prompt_messages), None)
+            self._conversation_text = "\n".join(
+                f"{msg.role}: {msg.content}" for msg in recent
+            )
+        return self._conversation_text
+    
     def add_detected_objects(self, objects: List[DetectedObject]) -> None:
         """Add detected objects to the memory"""
-        current_time = datetime.now().timestamp()
+        current_time = time.monotonic()
         for obj in objects:
-            obj_id = f"{obj.name}_{obj.bbox[0]}_{obj.bbox[1]}"
-            self.detected_objects_history[obj_id] = {
-                "object": obj,
-                "last_seen": current_time,
-                "first_seen": self.detected_objects_history.get(obj_id, {}).get("first_seen", current_time)
-            }
+            obj_id = (obj.name, obj.bbox[0], obj.bbox[1])
+            self._record_sighting(self.detected_objects_history, obj_id, "object", obj, current_time)
         
         # Clean up old objects (older than 5 minutes)
-        cutoff_time = current_time - 300  # 5 minutes in seconds
-        self.detected_objects_history = {
-            k: v for k, v in self.detected_objects_history.items()
-            if v["last_seen"] > cutoff_time
-        }
+        self._expire(self.detected_objects_history, current_time - 300, self.max_tracked)
     
     def add_detected_texts(self, texts: List[DetectedText]) -> None:
         """Add detected texts to the memory"""
-        current_time = datetime.now().timestamp()
+        current_time = time.monotonic()
         for text in texts:
-            text_id = f"{text.text}_{text.bbox[0]}_{text.bbox[1]}"
-            self.detected_texts_history[text_id] = {
-                "text": text,
-                "last_seen": current_time,
-                "first_seen": self.detected_texts_history.get(text_id, {}).get("first_seen", current_time)
-            }
+            text_id = (text.text, text.bbox[0], text.bbox[1])
+            self._record_sighting(self.detected_texts_history, text_id, "text", text, current_time)
         
         # Clean up old texts (older than 5 minutes)
-        cutoff_time = current_time - 300  # 5 minutes in seconds
-        self.detected_texts_history = {
-            k: v for k, v in self.detected_texts_history.items()
-            if v["last_seen"] > cutoff_time
-        }
+        self._expire(self.detected_texts_history, current_time - 300, self.max_tracked)
+    
+    @staticmethod
+    def _record_sighting(history: OrderedDict, key: Tuple[str, float, float], field: str, item: Any, seen_at: float) -> None:
+        """Record that an item was seen, keeping the history ordered by last sighting"""
+        record = history.get(key)
+        if record is None:
+            history[key] = {field: item, "last_seen": seen_at, "first_seen": seen_at}
+        else:
+            record[field] = item
+            record["last_seen"] = seen_at
+            history.move_to_end(key)
+    
+    @staticmethod
+    def _expire(history: OrderedDict, cutoff_time: float, max_size: int) -> None:
+        """
+        Drop entries last seen at or before the cutoff, then the least recently seen beyond
+        max_size, so a busy scene can't grow the history without bound; only dropped entries are visited
+        """
+        while history:
+            oldest = next(iter(history.values()))
+            if oldest["last_seen"] > cutoff_time and len(history) <= max_size:
+                break
+            history.popitem(last=False)
     
     def add_scene_description(self, description: str) -> None:
         """Add a scene description to the memory"""
         self.scene_descriptions.append({
             "description": description,
-            "timestamp": datetime.now().timestamp()
+            "timestamp": time.time()
         })
     
     def get_current_context(self) -> ConversationContext:
@@ -81,19 +120,22 @@ class MemoryService:
             detected_objects=[item["object"] for item in self.detected_objects_history.values()],
             detected_texts=[item["text"] for item in self.detected_texts_history.values()],
             current_scene_description=self.scene_descriptions[-1]["description"] if self.scene_descriptions else None,
-            last_processed_timestamp=datetime.now().timestamp()
+            last_processed_timestamp=time.time()
         )
     
     def clear_history(self) -> None:
         """Clear all conversation history"""
-        self.messages.clear()
+        with self._messages_lock:
+            self.messages.clear()
+            self._embeddings.clear()
+        self._conversation_text = None
         self.detected_objects_history.clear()
         self.detected_texts_history.clear()
         self.scene_descriptions.clear()
     
     def get_recent_objects(self, seconds: int = 30) -> List[DetectedObject]:
         """Get objects detected in the last N seconds"""
-        current_time = datetime.now().timestamp()
+        current_time = time.monotonic()
         cutoff_time = current_time - seconds
         
         recent_objects = [
@@ -106,7 +148,7 @@ class MemoryService:
     
     def get_recent_texts(self, seconds: int = 30) -> List[DetectedText]:
         """Get texts detected in the last N seconds"""
-        current_time = datetime.now().timestamp()
+        current_time = time.monotonic()
         cutoff_time = current_time - seconds
         
         recent_texts = [
@@ -117,16 +159,66 @@ class MemoryService:
         
         return recent_texts
     
-    def search_conversation(self, query: str) -> List[Message]:
+    def search_conversation(self, query: str, k: int = 5) -> List[Message]:
         """
-        Simple search through conversation history
-        A more sophisticated implementation would use embeddings
+        Return the k messages most similar in meaning to the query, by cosine similarity
+        of sentence embeddings. Falls back to a substring search when no embedding model
+        is available. Encoding is CPU-bound, so call this from a worker thread; it works on
+        a snapshot of the history, so messages can keep being added meanwhile.
         """
+        with self._messages_lock:
+            messages = list(self.messages)
+            embeddings = list(self._embeddings)
+        
+        model = get_embedding_model()
+        if model is not None and messages:
+            return self._semantic_search(model, query, k, messages, embeddings)
+        
         query = query.lower()
         matches = []
         
-        for message in self.messages:
+        for message in messages:
             if query in message.content.lower():
                 matches.append(message)
         
-        return matches
\ No newline at end of file
+        return matches
+    
+    def _semantic_search(
+        self,
+        model,
+        query: str,
+        k: int,
+        messages: List[Message],
+        embeddings: List[Optional[np.ndarray]]
+    ) -> List[Message]:
+        """Rank a snapshot of the messages against the query by embedding similarity"""
+        # Embed only messages added since the last search, in one batch
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            vectors = model.encode(
+                [messages[i].content for i in missing],
+                normalize_embeddings=True
+            )
+            # Stored as float16: half the memory per message, and unit vectors lose
+            # far less than ranking precision at that width
+            vectors = vectors.astype(np.float16)
+            computed = {}
+            for i, vector in zip(missing, vectors):
+                embeddings[i] = vector
+                computed[id(messages[i])] = vector
+            
+            # Save them for the next search. The history may have shifted since the snapshot,
+            # so slots are matched by message rather than by position
+            with self._messages_lock:
+                for i, message in enumerate(self.messages):
+                    if self._embeddings[i] is None:
+                        vector = computed.get(id(message))
+                        if vector is not None:
+                            self._embeddings[i] = vector
+        
+        # Embeddings are normalized, so the dot product is the cosine similarity
+        query_vector = model.encode(query, normalize_embeddings=True)
+        scores = np.stack(embeddings).astype(np.float32) @ query_vector
+        top = np.argsort(-scores)[:k]
+        
+        return [messages[i] for i in top]
@@ -0,0 +1,34 @@
+from functools import lru_cache
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.config import settings
+
+# One connection pool per process, shared by every service and the agent runner,
+# so concurrent requests reuse warm keep-alive connections instead of each client
+# opening (and TLS-handshaking) its own
+_LIMITS = httpx.Limits(
+    max_connections=settings.OPENAI_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+)
+_TIMEOUT = httpx.Timeout(settings.OPENAI_TIMEOUT)
+
+# The SDK retries 408/409/429/5xx responses and connection errors itself, backing off
+# exponentially with jitter and honouring Retry-After, so callers don't wrap calls in their own retries
+_MAX_RETRIES = settings.OPENAI_MAX_RETRIES
+
+@lru_cache(maxsize=1)
+def get_async_openai_client() -> AsyncOpenAI:
+    """Return the shared OpenAI client"""
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        max_retries=_MAX_RETRIES,
+        http_client=httpx.AsyncClient(limits=_LIMITS, timeout=_TIMEOUT),
+    )
+
+async def close_openai_clients() -> None:
+    """Close the shared client's connection pool, if it was created"""
+    if get_async_openai_client.cache_info().currsize:
+        await get_async_openai_client().close()
@@ -0,0 +1,85 @@
+import os
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, List, Optional, TypeVar
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    from app.services.vision_service import VisionService
+    from app.services.speech_service import SpeechService
+    from app.services.agent_service import AgentService
+    from app.services.memory_service import MemoryService
+    from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+# Shared service instances used by both the HTTP API and the WebSocket handler,
+# so models and API clients are only loaded once per process. Each service is
+# created on first use, which keeps torch/YOLO and the API clients out of server
+# startup and out of workers that never need them.
+
+T = TypeVar("T")
+
+def _shared(factory: Callable[[], T]) -> Callable[[], T]:
+    """
+    Create factory's result on first call and return the same instance afterwards.
+    Unlike lru_cache, concurrent first calls (HTTP dependencies run in the threadpool,
+    the WebSocket handler on the event loop) wait for one construction instead of each
+    building their own. created() tells whether the instance exists yet.
+    """
+    lock = threading.Lock()
+    instances: List[T] = []
+    
+    @functools.wraps(factory)
+    def get() -> T:
+        if not instances:
+            with lock:
+                if not instances:
+                    instances.append(factory())
+        return instances[0]
+    
+    get.created = lambda: bool(instances)  # type: ignore[attr-defined]
+    return get
+
+@_shared
+def get_vision_service() -> "VisionService":
+    from app.services.vision_service import VisionService
+    return VisionService()
+
+@_shared
+def get_speech_service() -> "SpeechService":
+    from app.services.speech_service import SpeechService
+    return SpeechService()
+
+@_shared
+def get_agent_service() -> "AgentService":
+    from app.services.agent_service import AgentService
+    return AgentService()
+
+@_shared
+def get_memory_service() -> "MemoryService":
+    from app.services.memory_service import MemoryService
+    return MemoryService()
+
+@_shared
+def get_embedding_model() -> Optional["SentenceTransformer"]:
+    """Sentence embedding model shared by every MemoryService, or None if it can't be loaded"""
+    try:
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(settings.MEMORY_EMBEDDING_MODEL)
+    except Exception as e:
+        logger.info(f"Semantic memory search unavailable, using substring search: {str(e)}")
+        return None
+
+def close_services() -> None:
+    """Release resources held by any services that were created"""
+    if get_vision_service.created():
+        get_vision_service().close()
+
+# Pool for CPU-heavy image decoding, kept off the event loop. Threads rather than
+# processes so uploads can be decoded straight from their spooled file; OpenCV
+# releases the GIL while decoding and resizing.
+decode_pool = ThreadPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) // 2))
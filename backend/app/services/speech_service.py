@@ -1,23 +1,16 @@
 import asyncio
 import base64
-import io
 import logging
-import tempfile
-import os
-import uuid
-from typing import Optional, Tuple, Dict, Any, List
-import numpy as np
-from pydub import AudioSegment
+from typing import Optional, Tuple, Dict, Any, List, AsyncIterator
 import sounddevice as sd
-import scipy.io.wavfile as wav
-from openai import OpenAI
 from app.config import settings
+from app.services.openai_client import get_async_openai_client
 
 logger = logging.getLogger(__name__)
 
 class SpeechService:
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = get_async_openai_client()
         self.stt_model = settings.STT_MODEL
         self.tts_model = settings.TTS_MODEL
         self.tts_voice = settings.TTS_VOICE
@@ -30,21 +23,12 @@ class SpeechService:
         Transcribe audio data to text using OpenAI's speech-to-text API
         """
         try:
-            # Save audio data to a temporary file
-            with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as temp_file:
-                temp_file.write(audio_data)
-                temp_file_path = temp_file.name
-
-            # Transcribe the audio
-            with open(temp_file_path, "rb") as audio_file:
-                transcript = self.client.audio.transcriptions.create(
-                    model=self.stt_model,
-                    file=audio_file,
-                    response_format="text"
-                )
-            
-            # Clean up the temporary file
-            os.unlink(temp_file_path)
+            # Upload the bytes directly; the filename tells the API the format
+            transcript = await self.client.audio.transcriptions.create(
+                model=self.stt_model,
+                file=("audio.webm", audio_data, "audio/webm"),
+                response_format="text"
+            )
             
             return transcript
         
@@ -52,19 +36,20 @@ class SpeechService:
             logger.error(f"Error transcribing audio: {str(e)}")
             return ""
     
-    async def text_to_speech(self, text: str) -> bytes:
+    async def text_to_speech(self, text: str, response_format: str = "mp3") -> bytes:
         """
         Convert text to speech using OpenAI's text-to-speech API
         """
         try:
-            response = self.client.audio.speech.create(
+            response = await self.client.audio.speech.create(
                 model=self.tts_model,
                 voice=self.tts_voice,
-                input=text
+                input=text,
+                response_format=response_format
             )
             
             # Get the audio content
-            audio_data = response.read()
+            audio_data = response.content
             
             return audio_data
         
@@ -72,6 +57,23 @@ class SpeechService:
             logger.error(f"Error generating speech: {str(e)}")
             return b""
     
+    async def text_to_speech_stream(self, text: str, response_format: str = "mp3") -> AsyncIterator[bytes]:
+        """
+        Convert text to speech, yielding audio chunks as soon as OpenAI produces them
+        """
+        try:
+            async with self.client.audio.speech.with_streaming_response.create(
+                model=self.tts_model,
+                voice=self.tts_voice,
+                input=text,
+                response_format=response_format
+            ) as response:
+                async for chunk in response.iter_bytes(chunk_size=4096):
+                    yield chunk
+        
+        except Exception as e:
+            logger.error(f"Error streaming speech: {str(e)}")
+    
     async def stream_speech(self, text: str) -> bytes:
         """
         Generate speech and stream it for immediate playback
@@ -93,7 +95,8 @@ class SpeechService:
             
             result = await self.transcribe_audio(audio_chunk)
             if result:
-                logger.info(f"Transcribed text: {result}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Transcribed text: %s", result)
                 return result
             
             return None
@@ -110,30 +113,20 @@ class SpeechService:
         async with self.speaking_lock:
             self.is_speaking = True
             try:
-                # Generate the speech
-                audio_data = await self.text_to_speech(text)
+                # Play raw 24kHz 16-bit PCM chunks as they arrive, so playback starts with the
+                # first chunk instead of after the whole utterance has been synthesized
+                played = False
+                with sd.RawOutputStream(samplerate=self.sample_rate, channels=1, dtype="int16") as stream:
+                    async for chunk in self.text_to_speech_stream(text, response_format="pcm"):
+                        # stop_speaking() takes effect at the next chunk
+                        if not self.is_speaking:
+                            break
+                        # Writes block while the device buffer is full, so keep them off the event loop
+                        await asyncio.to_thread(stream.write, chunk)
+                        played = True
                 
-                if not audio_data:
+                if not played:
                     logger.warning("No audio data generated")
-                    self.is_speaking = False
-                    return
-                
-                # Convert to in-memory WAV
-                audio = AudioSegment.from_file(io.BytesIO(audio_data), format="mp3")
-                wav_io = io.BytesIO()
-                audio.export(wav_io, format="wav")
-                wav_io.seek(0)
-                
-                # Read the WAV data
-                rate, data = wav.read(wav_io)
-                
-                # Convert to float32 for sounddevice
-                if data.dtype != np.float32:
-                    data = data.astype(np.float32) / np.iinfo(data.dtype).max
-                
-                # Play the audio (this blocks until audio is done playing)
-                sd.play(data, rate)
-                sd.wait()
                 
             except Exception as e:
                 logger.error(f"Error in speak method: {str(e)}")
@@ -142,6 +135,5 @@ class SpeechService:
     
     async def stop_speaking(self) -> None:
         """Stop any currently playing speech"""
-        if self.is_speaking:
-            sd.stop()
-            self.is_speaking = False
\ No newline at end of file
+        # The playback loop in speak() checks this before writing each chunk
+        self.is_speaking = False
\ No newline at end of file
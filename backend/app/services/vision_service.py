@@ -1,78 +1,361 @@
-import base64
+import asyncio
+import hashlib
+import os
+import time
+import pybase64
 import io
+import itertools
 import uuid
 import logging
 import numpy as np
 import cv2
 import json
-from typing import List, Tuple, Dict, Any, Optional
-from PIL import Image
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Dict, Any, Optional, Union
+from filelock import FileLock
 import pytesseract
-from openai import OpenAI
 from ultralytics import YOLO
 import torch
 from app.config import settings
+from app.services.openai_client import get_async_openai_client
+from app.services.registry import decode_pool
+from app.utils.helpers import resize_image, detect_text_area, decode_and_resize
 from app.models.schemas import DetectedObject, DetectedText, Caption, CaptionType, CaptionPriority, ProcessedFrame, VoiceFeedback
 
 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+# Tesseract's OpenMP threading is slower than a single thread per call, and OCR calls from
+# several worker threads would contend for cores; both the subprocess and tesserocr pick this up
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+try:
+    # Optional: keeps Tesseract and its model loaded in process instead of starting it for every image
+    import tesserocr
+except ImportError:
+    tesserocr = None
 
 logger = logging.getLogger(__name__)
 
+# Words that mark OCR text as sensitive, matched anywhere in the text in a single pass
+_SENSITIVE_KEYWORDS = [
+    'ssn', 'social security', 'password', 'pin', 'secret',
+    'username', 'login', 'account'
+]
+_SENSITIVE_PATTERN = re.compile("|".join(map(re.escape, _SENSITIVE_KEYWORDS)), re.IGNORECASE)
+
+def yolo_input_size() -> int:
+    """YOLO input size for frames of FRAME_MAX_SIZE, rounded up to a multiple of the model's 32px stride"""
+    return -(-settings.FRAME_MAX_SIZE // 32) * 32
+
+def _yolo_weights_path() -> str:
+    """The local YOLOv8 nano weights if present, otherwise the name Ultralytics downloads"""
+    model_path = "models/yolov8n.pt"
+    return model_path if os.path.exists(model_path) else "yolov8n.pt"
+
+def _tensorrt_engine_path() -> str:
+    """Engine file for the current input size and batch; an engine built for other shapes can't run these"""
+    return f"models/yolov8n-{yolo_input_size()}-b{settings.MAX_BATCH}.engine"
+
+def build_tensorrt_engine() -> None:
+    """
+    Export YOLOv8 nano to a TensorRT FP16 engine, unless it is disabled, there's no CUDA GPU,
+    or the engine already exists. The export takes minutes, so build it ahead of time with
+    `python -m app.services.vision_service`; otherwise the app's lifespan builds it in a worker thread.
+    With several server workers only one exports, under a file lock, while the others wait for its engine.
+    """
+    engine_path = _tensorrt_engine_path()
+    if not settings.YOLO_TENSORRT or not torch.cuda.is_available() or os.path.exists(engine_path):
+        return
+    try:
+        os.makedirs(os.path.dirname(engine_path), exist_ok=True)
+        with FileLock(engine_path + ".lock"):
+            # Another process may have built it while this one waited for the lock
+            if os.path.exists(engine_path):
+                return
+            
+            logger.info("Exporting YOLOv8 nano to a TensorRT engine, this can take a few minutes...")
+            # Dynamic shapes up to the micro-batch size, so batched calls use the same engine
+            exported = YOLO(_yolo_weights_path()).export(
+                format="engine",
+                imgsz=yolo_input_size(),
+                half=True,
+                dynamic=True,
+                batch=settings.MAX_BATCH,
+                device=0,
+            )
+            # Renamed into place only once complete, so no process ever loads a partial engine
+            os.replace(exported, engine_path)
+            logger.info(f"TensorRT engine written to {engine_path}")
+    except Exception as e:
+        logger.warning(f"Could not build a TensorRT engine, the PyTorch model will be used: {str(e)}")
+
 class VisionService:
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = get_async_openai_client()
         self.confidence_threshold = settings.DETECTION_CONFIDENCE_THRESHOLD
         self.ocr_confidence_threshold = settings.OCR_CONFIDENCE_THRESHOLD
-        self.last_processed_frame = None
-        self.frame_counter = 0
+        self.ocr_max_regions = settings.OCR_MAX_REGIONS
+        # Per-thread tesserocr APIs, created on first use in each OCR worker thread
+        self._tess_local = threading.local()
+        self.enable_ocr = settings.ENABLE_OCR
+        self.vision_model = settings.VISION_MODEL
+        self.vision_max_tokens = settings.VISION_MAX_TOKENS
+        self.vision_image_max_size = settings.VISION_IMAGE_MAX_SIZE
+        self.frame_max_size = settings.FRAME_MAX_SIZE
+        self.vision_image_detail = settings.VISION_IMAGE_DETAIL
+        self._jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, settings.VISION_JPEG_QUALITY]
+        self.scene_cache_size = settings.SCENE_CACHE_SIZE
+        self.scene_cache_ttl = settings.SCENE_CACHE_TTL
+        # Frame skipping state per caller key (a WebSocket connection): frames seen and the last
+        # processed result. Calls without a key, like HTTP uploads, always analyze their own frame
+        self._skip_state: Dict[str, Tuple[int, Optional[ProcessedFrame]]] = {}
+        
+        # Frame and caption IDs come from a counter; the random prefix keeps them unique across restarts
+        self._id_prefix = uuid.uuid4().hex[:8]
+        self._id_counter = itertools.count()
+        
+        # CPU-bound work (decoding, YOLO, JPEG encoding) runs here instead of on the event loop.
+        # One thread keeps model calls serialized; OpenCV and PyTorch release the GIL while they run.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vision")
+        # Tesseract calls wait on a subprocess, so several can run at once without holding the GIL
+        self._ocr_executor = ThreadPoolExecutor(max_workers=settings.OCR_WORKERS, thread_name_prefix="ocr")
+        
+        # Scene descriptions keyed by a hash of the frame pixels, so a steady camera (or the same
+        # uploaded image asked about twice) doesn't pay for another vision round-trip.
+        # Values are (expiry time, description), oldest first.
+        self._scene_cache: "OrderedDict[bytes, Tuple[float, str]]" = OrderedDict()
+        # Each caller's last scene as (expiry time, perceptual hash, description). A near-identical
+        # frame from the same caller reuses it; other callers' scenes are never matched this way
+        self._last_scene: Dict[str, Tuple[float, int, str]] = {}
+        # Frames whose perceptual hashes differ in at most this many bits count as the same scene
+        self.scene_hash_distance = settings.SCENE_HASH_DISTANCE
+        
+        # Shared micro-batcher coalescing YOLO calls for frames from every WebSocket connection and HTTP request
+        self.max_batch = settings.MAX_BATCH
+        self.batch_window = settings.BATCH_WINDOW_MS / 1000
+        # Created with the worker, on the event loop; the service itself may be built in a threadpool
+        # thread, where Python before 3.10 can't create asyncio objects
+        self._batch_queue: Optional[asyncio.Queue] = None
+        self._batch_worker_task: Optional[asyncio.Task] = None
+        self._batch_callers = 0  # _detect_objects_batched calls currently waiting on a result
         
         # Initialize YOLOv8 nano model - smallest version for edge devices
+        self._input_size = yolo_input_size()
         try:
-            # Try to load from a local path first if it exists
-            model_path = "models/yolov8n.pt"
-            import os
-            if os.path.exists(model_path):
-                self.yolo_model = YOLO(model_path)
-            else:
-                # Download from Ultralytics
-                self.yolo_model = YOLO("yolov8n.pt")
+            # Try to load from a local path first if it exists, otherwise download from Ultralytics
+            self.yolo_model = YOLO(_yolo_weights_path())
             
             logger.info("YOLOv8 nano model loaded successfully")
             self.yolo_available = True
+            
+            # On NVIDIA GPUs run inference in FP16, through the TensorRT engine if one was built at startup
+            self.yolo_half = torch.cuda.is_available()
+            if self.yolo_half and settings.YOLO_TENSORRT:
+                self.yolo_model = self._load_tensorrt_engine(self.yolo_model)
+            
+            # On the GPU, batches are staged in a pinned host buffer and preprocessed on the device
+            if self.yolo_half:
+                numel = self.max_batch * self._input_size * self._input_size * 3
+                self._pinned_input = torch.empty(numel, dtype=torch.uint8, pin_memory=True)
+                self._device_input = torch.empty(numel, dtype=torch.uint8, device="cuda")
+            else:
+                self._pinned_input = None
         except Exception as e:
             logger.error(f"Failed to load YOLOv8 model: {str(e)}")
             self.yolo_available = False
+            self.yolo_half = False
+            self._pinned_input = None
     
-    async def process_frame(self, frame_data: bytes) -> ProcessedFrame:
-        """Process a single frame from the webcam"""
+    def _load_tensorrt_engine(self, model: YOLO) -> YOLO:
+        """
+        Load the TensorRT FP16 engine built by build_tensorrt_engine.
+        Falls back to the PyTorch model if there is none or TensorRT isn't usable on this machine.
+        """
+        engine_path = _tensorrt_engine_path()
+        if not os.path.exists(engine_path):
+            logger.info("No TensorRT engine for this input size and batch, using the PyTorch model")
+            return model
         try:
-            # Convert bytes to numpy array (OpenCV format)
-            frame = self._bytes_to_cv_frame(frame_data)
+            engine = YOLO(engine_path, task="detect")
+            logger.info("YOLOv8 TensorRT engine loaded successfully")
+            return engine
+        except Exception as e:
+            logger.warning(f"TensorRT engine unavailable, using the PyTorch model: {str(e)}")
+            return model
+    
+    async def process_frame(self, frame_data: Union[bytes, memoryview, np.ndarray]) -> ProcessedFrame:
+        """Process a single frame from the webcam, either encoded bytes or an already decoded image"""
+        results = await self.process_frames_batch([frame_data])
+        return results[0]
+    
+    async def process_frames_batch(
+        self,
+        frames_data: List[Union[bytes, memoryview, np.ndarray]],
+        skip_key: Optional[str] = None
+    ) -> List[ProcessedFrame]:
+        """
+        Process several frames at once.
+        Object detection for every frame that needs it goes through the shared YOLO batcher.
+        With a skip_key, only every 10th frame from that caller is analyzed and the others
+        get that caller's last result.
+        """
+        results: List[Optional[ProcessedFrame]] = [None] * len(frames_data)
+        pending: List[Tuple[int, np.ndarray]] = []
+        
+        # Skip processing every N frames to reduce computational load.
+        # This is decided before decoding, so skipped frames are never decoded or queued at all.
+        if skip_key is None:
+            to_process = list(range(len(frames_data)))
+        else:
+            to_process = []
+            frame_count, last_frame = self._skip_state.get(skip_key, (0, None))
+            for i in range(len(frames_data)):
+                frame_count += 1
+                if frame_count % 10 != 0 and last_frame is not None:
+                    # Return a copy of the last processed frame with a new ID; the stored
+                    # result itself is left alone, it may still be on its way to the client
+                    results[i] = last_frame.model_copy(update={"frame_id": self._next_id(), "skipped": True})
+                else:
+                    to_process.append(i)
+            self._skip_state[skip_key] = (frame_count, last_frame)
+        
+        if to_process:
+            # Decoding runs in the shared CPU pool, not behind YOLO in the vision executor
+            loop = asyncio.get_running_loop()
+            decoded = await loop.run_in_executor(
+                decode_pool, self._decode_frames, [frames_data[i] for i in to_process]
+            )
             
-            # Skip processing every N frames to reduce computational load
-            self.frame_counter += 1
-            if self.frame_counter % 10 != 0 and self.last_processed_frame is not None:
-                # Return the last processed frame with a new ID
-                self.last_processed_frame.frame_id = str(uuid.uuid4())
-                return self.last_processed_frame
+            for i, frame in zip(to_process, decoded):
+                if isinstance(frame, Exception):
+                    results[i] = self._error_frame(frame)
+                else:
+                    pending.append((i, frame))
+        
+        if pending:
+            # Each frame's detection is queued right away and runs while its scene
+            # description and OCR are in flight, rather than before them
+            processed = await asyncio.gather(*(
+                self._analyze_frame(frame, asyncio.ensure_future(self._detect_objects_batched(frame)), skip_key)
+                for _, frame in pending
+            ))
+            for (i, _), result in zip(pending, processed):
+                results[i] = result
             
-            # Generate a base64 encoded image for OpenAI API
-            base64_image = self._encode_image(frame)
+            # Remember the newest successful result for the caller's skipped frames,
+            # unless the caller was forgotten in the meantime
+            analyzed = [result for result in processed if result.raw_description]
+            if skip_key is not None and analyzed and skip_key in self._skip_state:
+                frame_count, _ = self._skip_state[skip_key]
+                self._skip_state[skip_key] = (frame_count, analyzed[-1])
+        
+        return results
+    
+    def forget(self, skip_key: str) -> None:
+        """Drop a caller's frame skipping and scene state, e.g. when its connection closes"""
+        self._skip_state.pop(skip_key, None)
+        self._last_scene.pop(skip_key, None)
+    
+    async def process_frame_batched(
+        self,
+        frame_data: Union[bytes, memoryview, np.ndarray],
+        skip_key: Optional[str] = None
+    ) -> ProcessedFrame:
+        """Process a frame, running its YOLO step together with frames from concurrent callers"""
+        results = await self.process_frames_batch([frame_data], skip_key)
+        return results[0]
+    
+    async def _detect_objects_batched(self, frame: np.ndarray) -> List[DetectedObject]:
+        """Detect objects in a frame through the shared micro-batcher"""
+        if self._batch_queue is None:
+            self._batch_queue = asyncio.Queue()
+        if self._batch_worker_task is None or self._batch_worker_task.done():
+            self._batch_worker_task = asyncio.create_task(self._batch_worker())
+        
+        self._batch_callers += 1
+        try:
+            future = asyncio.get_running_loop().create_future()
+            await self._batch_queue.put((frame, future))
+            return await future
+        finally:
+            self._batch_callers -= 1
+    
+    async def _batch_worker(self) -> None:
+        """
+        Collect frames submitted within a short window and run them through
+        YOLO as a single batch. Only detection is batched; scene descriptions
+        and OCR run in each caller, so they never hold up other callers' frames.
+        """
+        window = self.batch_window
+        max_batch = self.max_batch
+        while True:
+            batch = [await self._batch_queue.get()]
             
-            # Run parallel processing
-            # 1. Get scene description from OpenAI Vision
-            scene_description = await self._get_scene_description(base64_image)
+            # A lone caller is never kept waiting; only hold the batch open
+            # when someone else is in flight and could contribute a frame
+            if self._batch_callers > len(batch) + self._batch_queue.qsize():
+                await asyncio.sleep(window)
             
-            # 2. Detect objects in the frame
-            detected_objects = await self._detect_objects(frame)
+            while len(batch) < max_batch:
+                try:
+                    batch.append(self._batch_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
             
-            # 3. Extract text from the frame
-            if settings.ENABLE_OCR:
-                detected_texts = await self._extract_text(frame)
-            else:
-                detected_texts = []
+            # Model calls are serialized in the vision executor anyway, so waiting here
+            # just lets the next batch fill up while this one runs
+            try:
+                detections = await self._detect_objects_batch([frame for frame, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, future), detected_objects in zip(batch, detections):
+                if not future.done():
+                    future.set_result(detected_objects)
+    
+    def _decode_frames(self, frames_data: List[Union[bytes, memoryview, np.ndarray]]) -> List[Union[np.ndarray, Exception]]:
+        """Decode a batch of frames, returning the error in place of any frame that fails"""
+        decoded: List[Union[np.ndarray, Exception]] = []
+        for frame_data in frames_data:
+            try:
+                # Convert bytes to numpy array (OpenCV format) unless already decoded
+                if isinstance(frame_data, np.ndarray):
+                    frame = frame_data
+                else:
+                    frame = self._bytes_to_cv_frame(frame_data)
+                if frame is None:
+                    raise ValueError("Could not decode frame")
+                # Downscale once to the YOLO input size; detection, OCR and the
+                # OpenAI upload all work from this smaller frame
+                decoded.append(resize_image(frame, self.frame_max_size))
+            except Exception as e:
+                decoded.append(e)
+        return decoded
+    
+    async def _analyze_frame(
+        self,
+        frame: np.ndarray,
+        detections: "asyncio.Future[List[DetectedObject]]",
+        caller_key: Optional[str] = None
+    ) -> ProcessedFrame:
+        """
+        Build the processed frame result for a frame.
+        detections is the frame's object detection, already running in the YOLO batcher.
+        """
+        try:
+            # 1. Get scene description from OpenAI Vision and 2. extract text from the frame, concurrently
+            scene_description, detected_texts = await asyncio.gather(
+                self._describe_frame(frame, caller_key),
+                self._extract_text(frame) if self.enable_ocr else asyncio.sleep(0, result=[])
+            )
+            detected_objects = await detections
             
-            # 4. Check for credit cards or sensitive information
+            # 3. Check for credit cards or sensitive information
             sensitive_info_detected = any(text.is_sensitive or text.is_card_number for text in detected_texts)
             
             # Generate captions based on the scene description and detected objects/text
@@ -87,39 +370,87 @@ class VisionService:
             result = ProcessedFrame(
                 captions=captions,
                 voiceFeedback=voice_feedback,
-                objects=[{
-                    "name": obj.name,
-                    "distance": obj.distance if obj.distance else 0,
-                    "direction": obj.direction if obj.direction else "center"
-                } for obj in detected_objects],
                 raw_description=scene_description,
                 detected_texts=detected_texts,
                 detected_objects=detected_objects,
-                frame_id=str(uuid.uuid4())
+                frame_id=self._next_id()
             )
             
-            # Store the result for potential reuse
-            self.last_processed_frame = result
-            
             return result
         
         except Exception as e:
-            logger.error(f"Error processing frame: {str(e)}")
-            return ProcessedFrame(
-                captions=[Caption(
-                    id=str(uuid.uuid4()),
-                    text=f"Error processing frame: {str(e)}",
-                    type=CaptionType.VISUAL,
-                    priority=CaptionPriority.HIGH
-                )],
-                frame_id=str(uuid.uuid4())
-            )
+            # Don't leave the detection running for a frame that has already failed
+            detections.cancel()
+            return self._error_frame(e)
+    
+    def close(self) -> None:
+        """Stop the batch worker and release the threads used for CPU-bound vision work"""
+        if self._batch_worker_task is not None:
+            self._batch_worker_task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._ocr_executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _next_id(self) -> str:
+        """Return a unique ID for a frame or caption"""
+        return f"{self._id_prefix}-{next(self._id_counter)}"
     
-    async def _get_scene_description(self, base64_image: str) -> str:
+    def _error_frame(self, error: Exception) -> ProcessedFrame:
+        """Build a processed frame that reports a processing error"""
+        logger.error(f"Error processing frame: {str(error)}")
+        return ProcessedFrame(
+            captions=[Caption(
+                id=self._next_id(),
+                text=f"Error processing frame: {str(error)}",
+                type=CaptionType.VISUAL,
+                priority=CaptionPriority.HIGH
+            )],
+            frame_id=self._next_id()
+        )
+    
+    async def _describe_frame(self, frame: np.ndarray, caller_key: Optional[str] = None) -> str:
+        """
+        Get a scene description for the frame, reusing a recent one for identical pixels,
+        or the caller's previous one when the scene looks the same
+        """
+        # Hashing a full-resolution frame takes milliseconds. hashlib releases the GIL, so it runs
+        # in the shared CPU pool rather than on the event loop or behind YOLO in the vision executor
+        loop = asyncio.get_running_loop()
+        frame_hash, perceptual_hash = await loop.run_in_executor(decode_pool, self._frame_hashes, frame)
+        now = time.monotonic()
+        cached = self._scene_cache.get(frame_hash)
+        if cached is not None:
+            expires_at, description = cached
+            if expires_at > now:
+                self._scene_cache.move_to_end(frame_hash)
+                return description
+            del self._scene_cache[frame_hash]
+        
+        # Camera noise changes the exact hash on every frame, so also reuse the caller's
+        # previous description if its scene looks the same
+        last_scene = self._last_scene.get(caller_key) if caller_key is not None else None
+        if last_scene is not None:
+            expires_at, last_hash, description = last_scene
+            if expires_at > now and bin(perceptual_hash ^ last_hash).count("1") <= self.scene_hash_distance:
+                return description
+        
+        # Generate a base64 encoded image for OpenAI API. cv2 releases the GIL, so this also runs
+        # in the shared pool and the request goes out without waiting behind YOLO
+        base64_image = await loop.run_in_executor(decode_pool, self._encode_image, frame)
+        return await self._get_scene_description(
+            base64_image, cache_key=frame_hash, caller_key=caller_key, perceptual_hash=perceptual_hash
+        )
+    
+    async def _get_scene_description(
+        self,
+        base64_image: str,
+        cache_key: Optional[bytes] = None,
+        caller_key: Optional[str] = None,
+        perceptual_hash: int = 0
+    ) -> str:
         """Get a description of the scene from OpenAI Vision"""
         try:
-            response = self.client.chat.completions.create(
-                model=settings.VISION_MODEL,
+            response = await self.client.chat.completions.create(
+                model=self.vision_model,
                 messages=[
                     {
                         "role": "system",
@@ -138,184 +469,283 @@ class VisionService:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
+                                    "url": f"data:image/jpeg;base64,{base64_image}",
+                                    "detail": self.vision_image_detail
                                 }
                             }
                         ]
                     }
                 ],
-                max_tokens=settings.VISION_MAX_TOKENS
+                max_tokens=self.vision_max_tokens
             )
-            return response.choices[0].message.content
+            description = response.choices[0].message.content
+            # Only successful descriptions are cached; failures should be retried on the next frame
+            expires_at = time.monotonic() + self.scene_cache_ttl
+            if cache_key is not None:
+                self._scene_cache[cache_key] = (expires_at, description)
+                if len(self._scene_cache) > self.scene_cache_size:
+                    self._scene_cache.popitem(last=False)
+            # Callers that were forgotten while the request was in flight aren't recorded again
+            if caller_key is not None and caller_key in self._skip_state:
+                self._last_scene[caller_key] = (expires_at, perceptual_hash, description)
+            return description
         except Exception as e:
             logger.error(f"Error getting scene description: {str(e)}")
             return "Unable to describe the scene at this time."
     
     async def _detect_objects(self, frame: np.ndarray) -> List[DetectedObject]:
         """Detect objects in the frame using YOLOv8 nano"""
-        detected_objects = []
-        height, width = frame.shape[:2]
-        
+        detections = await self._detect_objects_batch([frame])
+        return detections[0]
+    
+    async def _detect_objects_batch(self, frames: List[np.ndarray]) -> List[List[DetectedObject]]:
+        """Detect objects in several frames with a single YOLOv8 nano call"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._detect_objects_batch_sync, frames)
+    
+    def _detect_objects_batch_sync(self, frames: List[np.ndarray]) -> List[List[DetectedObject]]:
+        """Blocking part of _detect_objects_batch, run in the vision executor"""
         try:
             if self.yolo_available:
-                # Run YOLOv8 inference on the frame
+                # Run YOLOv8 inference on all frames at once
                 results = self.yolo_model.predict(
-                    source=frame,
+                    source=self._frames_to_device(frames) if self._fits_input_buffer(frames) else frames,
                     conf=self.confidence_threshold,
+                    half=self.yolo_half,
                     verbose=False,
                 )
                 
-                # Process YOLOv8 results
-                if len(results) > 0:
-                    result = results[0]  # Get the first result
-                    
-                    # Extract boxes, confidence scores, and class IDs
-                    boxes = result.boxes.xyxy.cpu().numpy() if len(result.boxes) > 0 else []
-                    confs = result.boxes.conf.cpu().numpy() if len(result.boxes) > 0 else []
-                    class_ids = result.boxes.cls.cpu().numpy().astype(int) if len(result.boxes) > 0 else []
-                    
-                    # Get class names
-                    class_names = result.names
-                    
-                    # Process each detection
-                    for i, (box, conf, class_id) in enumerate(zip(boxes, confs, class_ids)):
-                        if conf >= self.confidence_threshold:
-                            x1, y1, x2, y2 = box
-                            
-                            # Get object name from class ID
-                            obj_name = class_names[class_id]
-                            
-                            # Calculate direction based on the object's position
-                            center_x = (x1 + x2) / 2
-                            if center_x < width / 3:
-                                direction = "left"
-                            elif center_x > 2 * width / 3:
-                                direction = "right"
-                            else:
-                                direction = "center"
-                            
-                            # Estimate distance based on the size of the bounding box and position
-                            # Objects lower in the frame and with larger boxes are typically closer
-                            box_height = y2 - y1
-                            box_relative_height = box_height / height
-                            y_position = (y1 + y2) / 2 / height  # Normalized y-position
-                            
-                            # Distance estimation formula - objects lower in the frame (higher y) are closer
-                            # and objects with larger bounding boxes are closer
-                            # This is a heuristic and can be refined with camera parameters
-                            distance = (1.0 - y_position) * 5.0  # 0-5 meters
-                            if box_relative_height > 0.5:
-                                distance *= 0.5  # Very large objects are closer
-                            elif box_relative_height > 0.25:
-                                distance *= 0.75  # Large objects are closer
-                                
-                            # Clamp distance between 0.5 and 10 meters
-                            distance = max(0.5, min(10.0, distance))
-                            
-                            detected_objects.append(DetectedObject(
-                                name=obj_name,
-                                confidence=float(conf),
-                                bbox=[float(x1), float(y1), float(x2), float(y2)],
-                                distance=distance,
-                                direction=direction
-                            ))
+                return [
+                    self._parse_yolo_result(result, frame)
+                    for result, frame in zip(results, frames)
+                ]
             else:
                 # If YOLO is not available, fall back to the simple region-based approach
                 logger.warning("YOLO model not available. Using fallback object detection.")
-                
-                # Simulate detection by dividing the frame into regions
-                regions = [
-                    (0, 0, width//2, height//2),
-                    (width//2, 0, width, height//2),
-                    (0, height//2, width//2, height),
-                    (width//2, height//2, width, height),
-                ]
-                
-                for i, (x1, y1, x2, y2) in enumerate(regions):
-                    # Extract region and get its average color
-                    region = frame[y1:y2, x1:x2]
-                    avg_color = np.mean(region, axis=(0, 1))
-                    
-                    # Determine a placeholder object based on the color
-                    if np.mean(avg_color) > 200:  # Very bright region
-                        obj_name = "bright object"
-                    elif np.mean(avg_color) < 50:  # Very dark region
-                        obj_name = "dark object"
-                    else:
-                        obj_name = f"object {i+1}"
-                    
-                    # Calculate a direction based on the region position
-                    if x1 < width // 3:
-                        direction = "left"
-                    elif x1 > 2 * width // 3:
-                        direction = "right"
-                    else:
-                        direction = "center"
-                    
-                    # Calculate a fake distance based on y-position (lower in the frame = closer)
-                    relative_y = y1 / height
-                    distance = 1.0 + 4.0 * relative_y  # 1 to 5 meters
-                    
-                    detected_objects.append(DetectedObject(
-                        name=obj_name,
-                        confidence=0.8,  # Placeholder confidence
-                        bbox=[float(x1), float(y1), float(x2), float(y2)],
-                        distance=distance,
-                        direction=direction
-                    ))
+                return [self._fallback_detect_objects(frame) for frame in frames]
         
         except Exception as e:
             logger.error(f"Error detecting objects: {str(e)}")
-            # If there's an error, return an empty list or fallback to simple regions
-            if not detected_objects:
-                # Placeholder object in the center
-                detected_objects.append(DetectedObject(
-                    name="unknown object",
-                    confidence=0.5,
-                    bbox=[float(width/4), float(height/4), float(3*width/4), float(3*height/4)],
-                    distance=2.0,
-                    direction="center"
-                ))
+            # If there's an error, fall back to a placeholder object in the center
+            return [[self._placeholder_object(frame)] for frame in frames]
+    
+    def _fits_input_buffer(self, frames: List[np.ndarray]) -> bool:
+        """Whether the frames can go through the pinned input buffer rather than ultralytics' CPU preprocessing"""
+        return (
+            self._pinned_input is not None
+            and len(frames) <= self.max_batch
+            and all(
+                frame.ndim == 3 and frame.shape[2] == 3 and frame.dtype == np.uint8
+                and max(frame.shape[:2]) <= self._input_size
+                for frame in frames
+            )
+        )
+    
+    def _frames_to_device(self, frames: List[np.ndarray]) -> torch.Tensor:
+        """
+        Stage a batch of BGR frames in the pinned buffer, copy it to the GPU in one transfer
+        and convert it there to the normalized FP16 RGB tensor YOLO takes.
+        Frames are padded at the bottom and right only, so box coordinates stay in frame pixels.
+        """
+        count = len(frames)
+        height = -(-max(frame.shape[0] for frame in frames) // 32) * 32
+        width = -(-max(frame.shape[1] for frame in frames) // 32) * 32
+        numel = count * height * width * 3
+        
+        host = self._pinned_input[:numel].view(count, height, width, 3)
+        host_array = host.numpy()
+        host_array.fill(114)  # Ultralytics' letterbox padding value
+        for slot, frame in zip(host_array, frames):
+            slot[:frame.shape[0], :frame.shape[1]] = frame
+        
+        # predict() synchronizes on its results, so the buffer is free again before the next batch
+        device = self._device_input[:numel].view(count, height, width, 3)
+        device.copy_(host, non_blocking=True)
+        
+        # BGR to RGB and NHWC to NCHW, scaled to [0, 1]
+        return device.flip(-1).permute(0, 3, 1, 2).half().div_(255)
+    
+    def _parse_yolo_result(self, result: Any, frame: np.ndarray) -> List[DetectedObject]:
+        """Convert a single YOLOv8 result into detected objects"""
+        height, width = frame.shape[:2]
+        
+        if len(result.boxes) == 0:
+            return []
+        
+        # Extract boxes, confidence scores, and class IDs as arrays, keeping confident detections
+        # boxes.data is (N, 6) rows of x1, y1, x2, y2, conf, cls, so this is one device-to-host copy
+        data = result.boxes.data.cpu().numpy()
+        boxes = data[:, :4]
+        confs = data[:, 4]
+        class_ids = data[:, 5].astype(int)
+        keep = confs >= self.confidence_threshold
+        boxes, confs, class_ids = boxes[keep], confs[keep], class_ids[keep]
+        
+        # Get class names
+        class_names = result.names
+        
+        # Direction and distance are computed for every detection at once rather than box by box
+        x1, y1, x2, y2 = boxes.T
+        
+        # Calculate direction based on the object's position
+        center_x = (x1 + x2) / 2
+        directions = np.where(
+            center_x < width / 3, "left",
+            np.where(center_x > 2 * width / 3, "right", "center")
+        )
+        
+        # Estimate distance based on the size of the bounding box and position
+        # Objects lower in the frame and with larger boxes are typically closer
+        box_relative_height = (y2 - y1) / height
+        y_position = (y1 + y2) / 2 / height  # Normalized y-position
+        
+        # Distance estimation formula - objects lower in the frame (higher y) are closer
+        # and objects with larger bounding boxes are closer
+        # This is a heuristic and can be refined with camera parameters
+        distances = (1.0 - y_position) * 5.0  # 0-5 meters
+        distances *= np.where(
+            box_relative_height > 0.5, 0.5,  # Very large objects are closer
+            np.where(box_relative_height > 0.25, 0.75, 1.0)  # Large objects are closer
+        )
+        
+        # Clamp distance between 0.5 and 10 meters
+        distances = np.clip(distances, 0.5, 10.0)
+        
+        # The values are already plain Python types of the right shape, so skip pydantic validation
+        return [
+            DetectedObject.model_construct(
+                name=class_names[class_id],
+                confidence=conf,
+                bbox=bbox,
+                distance=distance,
+                direction=direction
+            )
+            for bbox, conf, class_id, distance, direction in zip(
+                boxes.tolist(), confs.tolist(), class_ids.tolist(), distances.tolist(), directions.tolist()
+            )
+        ]
+    
+    def _fallback_detect_objects(self, frame: np.ndarray) -> List[DetectedObject]:
+        """Simulate detection by dividing the frame into regions"""
+        detected_objects = []
+        height, width = frame.shape[:2]
+        
+        regions = [
+            (0, 0, width//2, height//2),
+            (width//2, 0, width, height//2),
+            (0, height//2, width//2, height),
+            (width//2, height//2, width, height),
+        ]
+        
+        # Average brightness of all four quadrants in one pass over the frame: split each axis
+        # in half and average over everything but the quadrant indices (odd edge rows/columns are dropped)
+        half_h, half_w = height // 2, width // 2
+        quadrants = frame[:2 * half_h, :2 * half_w].reshape(2, half_h, 2, half_w, -1)
+        brightness = quadrants.mean(axis=(1, 3, 4)).ravel()  # Same order as regions
+        
+        for i, (x1, y1, x2, y2) in enumerate(regions):
+            # Determine a placeholder object based on the region's average color
+            if brightness[i] > 200:  # Very bright region
+                obj_name = "bright object"
+            elif brightness[i] < 50:  # Very dark region
+                obj_name = "dark object"
+            else:
+                obj_name = f"object {i+1}"
+            
+            # Calculate a direction based on the region position
+            if x1 < width // 3:
+                direction = "left"
+            elif x1 > 2 * width // 3:
+                direction = "right"
+            else:
+                direction = "center"
+            
+            # Calculate a fake distance based on y-position (lower in the frame = closer)
+            relative_y = y1 / height
+            distance = 1.0 + 4.0 * relative_y  # 1 to 5 meters
+            
+            detected_objects.append(DetectedObject(
+                name=obj_name,
+                confidence=0.8,  # Placeholder confidence
+                bbox=[float(x1), float(y1), float(x2), float(y2)],
+                distance=distance,
+                direction=direction
+            ))
         
         return detected_objects
     
+    def _placeholder_object(self, frame: np.ndarray) -> DetectedObject:
+        """Placeholder object in the center of the frame"""
+        height, width = frame.shape[:2]
+        return DetectedObject(
+            name="unknown object",
+            confidence=0.5,
+            bbox=[float(width/4), float(height/4), float(3*width/4), float(3*height/4)],
+            distance=2.0,
+            direction="center"
+        )
+    
     async def _extract_text(self, frame: np.ndarray) -> List[DetectedText]:
         """Extract text from the frame using OCR"""
+        # Tesseract releases the GIL (and pytesseract waits on a subprocess), so worker threads are enough
+        loop = asyncio.get_running_loop()
+        # Grayscale once; region detection and Tesseract both work from it
+        gray = await loop.run_in_executor(decode_pool, cv2.cvtColor, frame, cv2.COLOR_BGR2GRAY)
+        regions = await loop.run_in_executor(decode_pool, detect_text_area, gray)
+        
+        # With no candidate regions, or too many to be worth separate Tesseract runs, read the whole frame
+        if not regions or len(regions) > self.ocr_max_regions:
+            return await loop.run_in_executor(self._ocr_executor, self._extract_text_sync, gray)
+        
+        # Otherwise read each candidate region on its own as a single block of text;
+        # small crops skip most of Tesseract's layout analysis
+        region_texts = await asyncio.gather(*(
+            loop.run_in_executor(
+                self._ocr_executor, self._extract_text_sync,
+                gray[y1:y2, x1:x2], (x1, y1), True
+            )
+            for x1, y1, x2, y2 in regions
+        ))
+        return [text for texts in region_texts for text in texts]
+    
+    def _extract_text_sync(
+        self,
+        gray: np.ndarray,
+        offset: Tuple[int, int] = (0, 0),
+        single_block: bool = False
+    ) -> List[DetectedText]:
+        """
+        Blocking part of _extract_text, on a grayscale image.
+        offset is the image's position in the full frame, and is added to the returned boxes.
+        """
         try:
-            # Convert frame to PIL Image for tesseract
-            pil_image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            
-            # Get OCR data with bounding boxes
-            ocr_data = pytesseract.image_to_data(pil_image, output_type=pytesseract.Output.DICT)
+            # Get OCR words with bounding boxes, in process when tesserocr is installed
+            if tesserocr is not None:
+                words = self._ocr_words_tesserocr(gray, single_block)
+            else:
+                words = self._ocr_words_pytesseract(gray, single_block)
+            offset_x, offset_y = offset
             
             detected_texts = []
             
             # Process OCR results
-            for i in range(len(ocr_data['text'])):
+            for text, conf, x, y, w, h in words:
                 # Skip empty text or low confidence
-                if int(float(ocr_data['conf'][i])) < self.ocr_confidence_threshold or not ocr_data['text'][i].strip():
+                text = text.strip()
+                if conf < self.ocr_confidence_threshold or not text:
                     continue
                 
                 # Get bounding box
-                x = ocr_data['left'][i]
-                y = ocr_data['top'][i]
-                w = ocr_data['width'][i]
-                h = ocr_data['height'][i]
+                x += offset_x
+                y += offset_y
                 
-                text = ocr_data['text'][i].strip()
-                confidence = float(ocr_data['conf'][i]) / 100.0
+                confidence = conf / 100.0
                 
                 # Check if it looks like a credit card number (16 digits, possibly with spaces)
-                is_card_number = bool(
-                    len(''.join(c for c in text if c.isdigit())) in [15, 16] and  # Amex has 15 digits
-                    any(c.isdigit() for c in text)
-                )
+                is_card_number = sum(c.isdigit() for c in text) in (15, 16)  # Amex has 15 digits
                 
                 # Check if it contains other sensitive information
-                is_sensitive = any(keyword in text.lower() for keyword in [
-                    'ssn', 'social security', 'password', 'pin', 'secret', 
-                    'username', 'login', 'account'
-                ])
+                is_sensitive = _SENSITIVE_PATTERN.search(text) is not None
                 
                 detected_texts.append(DetectedText(
                     text=text,
@@ -330,6 +760,45 @@ class VisionService:
             logger.error(f"Error extracting text: {str(e)}")
             return []
     
+    def _ocr_words_tesserocr(self, gray: np.ndarray, single_block: bool) -> List[Tuple[str, float, int, int, int, int]]:
+        """OCR a grayscale image with this thread's resident Tesseract API, as (text, conf, x, y, w, h) words"""
+        # PyTessBaseAPI isn't thread-safe, so each OCR worker thread keeps its own, with the model loaded once
+        api = getattr(self._tess_local, "api", None)
+        if api is None:
+            api = self._tess_local.api = tesserocr.PyTessBaseAPI(oem=tesserocr.OEM.LSTM_ONLY)
+        
+        api.SetPageSegMode(tesserocr.PSM.SINGLE_BLOCK if single_block else tesserocr.PSM.AUTO)
+        height, width = gray.shape
+        api.SetImageBytes(np.ascontiguousarray(gray).tobytes(), width, height, 1, width)
+        api.Recognize()
+        
+        iterator = api.GetIterator()
+        if iterator is None:
+            return []
+        
+        level = tesserocr.RIL.WORD
+        words = []
+        for word in tesserocr.iterate_level(iterator, level):
+            box = word.BoundingBox(level)
+            if box is None:
+                continue
+            x1, y1, x2, y2 = box
+            words.append((word.GetUTF8Text(level) or "", word.Confidence(level), x1, y1, x2 - x1, y2 - y1))
+        return words
+    
+    @staticmethod
+    def _ocr_words_pytesseract(gray: np.ndarray, single_block: bool) -> List[Tuple[str, float, int, int, int, int]]:
+        """OCR a grayscale image through the tesseract command line, as (text, conf, x, y, w, h) words"""
+        config = "--psm 6 --oem 1" if single_block else "--oem 1"
+        ocr_data = pytesseract.image_to_data(gray, config=config, output_type=pytesseract.Output.DICT)
+        return [
+            (text, float(conf), x, y, w, h)
+            for text, conf, x, y, w, h in zip(
+                ocr_data['text'], ocr_data['conf'],
+                ocr_data['left'], ocr_data['top'], ocr_data['width'], ocr_data['height']
+            )
+        ]
+    
     def _generate_captions(
         self, 
         scene_description: str, 
@@ -341,7 +810,7 @@ class VisionService:
         
         # Add the main scene description
         captions.append(Caption(
-            id=str(uuid.uuid4()),
+            id=self._next_id(),
             text=scene_description,
             type=CaptionType.VISUAL,
             priority=CaptionPriority.MEDIUM
@@ -355,7 +824,7 @@ class VisionService:
                     f"{obj.name} to your {obj.direction}" for obj in nearby_objects
                 )
                 captions.append(Caption(
-                    id=str(uuid.uuid4()),
+                    id=self._next_id(),
                     text=nearby_text,
                     type=CaptionType.VISUAL,
                     priority=CaptionPriority.HIGH
@@ -368,7 +837,7 @@ class VisionService:
             if sensitive_texts:
                 sensitive_warning = "Sensitive information detected. Be cautious about privacy."
                 captions.append(Caption(
-                    id=str(uuid.uuid4()),
+                    id=self._next_id(),
                     text=sensitive_warning,
                     type=CaptionType.VISUAL,
                     priority=CaptionPriority.HIGH
@@ -379,7 +848,7 @@ class VisionService:
             if other_texts:
                 texts_found = "Text found: " + "; ".join(txt.text for txt in other_texts[:3])
                 captions.append(Caption(
-                    id=str(uuid.uuid4()),
+                    id=self._next_id(),
                     text=texts_found,
                     type=CaptionType.VISUAL,
                     priority=CaptionPriority.MEDIUM
@@ -419,16 +888,40 @@ class VisionService:
         
         return None
     
-    def _bytes_to_cv_frame(self, frame_data: bytes) -> np.ndarray:
-        """Convert bytes to OpenCV frame"""
-        # Convert bytes to numpy array
-        nparr = np.frombuffer(frame_data, np.uint8)
-        # Decode image
-        return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    def _bytes_to_cv_frame(self, frame_data: Union[bytes, memoryview]) -> np.ndarray:
+        """Convert bytes to OpenCV frame, at most frame_max_size on its longest side"""
+        # Frames at least twice that size are decoded at half resolution by libjpeg's DCT scaling,
+        # which is much cheaper than a full decode followed by a downscale
+        return decode_and_resize(frame_data, self.frame_max_size)
+    
+    @staticmethod
+    def _hash_frame(frame: np.ndarray) -> bytes:
+        """Hash a decoded frame's pixels, used as the scene cache key"""
+        return hashlib.blake2b(np.ascontiguousarray(frame).data, digest_size=16).digest()
+    
+    @staticmethod
+    def _ahash_frame(frame: np.ndarray) -> int:
+        """64-bit average hash of a frame; similar-looking frames differ in few bits"""
+        gray = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (8, 8), interpolation=cv2.INTER_AREA)
+        bits = np.packbits(gray > gray.mean())
+        return int.from_bytes(bits.tobytes(), "big")
+    
+    @classmethod
+    def _frame_hashes(cls, frame: np.ndarray) -> Tuple[bytes, int]:
+        """Exact and perceptual hashes of a frame, computed together in one pool call"""
+        return cls._hash_frame(frame), cls._ahash_frame(frame)
     
     def _encode_image(self, frame: np.ndarray) -> str:
         """Encode an image as base64 for the OpenAI API"""
+        # Downscale first; the model doesn't look at more pixels than this, so they're pure upload cost
+        frame = resize_image(frame, self.vision_image_max_size)
         # Convert frame to JPEG
-        _, buffer = cv2.imencode('.jpg', frame)
+        _, buffer = cv2.imencode('.jpg', frame, self._jpeg_params)
         # Convert to base64
-        return base64.b64encode(buffer).decode('utf-8')
\ No newline at end of file
+        return pybase64.b64encode_as_string(buffer)
+
+
+if __name__ == "__main__":
+    # Build the TensorRT engine ahead of time, e.g. while building a deployment image
+    logging.basicConfig(level=logging.INFO)
+    build_tensorrt_engine()
@@ -3,22 +3,24 @@ import io
 import os
 import cv2
 import numpy as np
-from typing import Tuple, Optional, Dict, Any, List
+from typing import Tuple, Optional, Dict, Any, List, BinaryIO
 from PIL import Image
 import uuid
 import time
 import logging
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Largest read made at once when copying an upload into its decode buffer
+_READ_CHUNK_SIZE = 64 * 1024
+
 def generate_id() -> str:
     """Generate a unique ID for items"""
-    return str(uuid.uuid4())
+    return uuid.uuid4().hex
 
 def get_timestamp() -> float:
     """Get current timestamp in seconds"""
-    return datetime.now().timestamp()
+    return time.time()
 
 def decode_base64_image(base64_string: str) -> np.ndarray:
     """Decode a base64 image to OpenCV format"""
@@ -35,6 +37,58 @@ def decode_base64_image(base64_string: str) -> np.ndarray:
     # Decode image
     return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
+def decode_and_resize(image_data: bytes, max_size: int = 800) -> Optional[np.ndarray]:
+    """
+    Decode image bytes to OpenCV format, resized to at most max_size.
+    Large images are decoded at half resolution to skip work on pixels that get resized away.
+    """
+    flags = _decode_flags(io.BytesIO(image_data), max_size)
+    return _decode_buffer(np.frombuffer(image_data, np.uint8), flags, max_size)
+
+def decode_and_resize_stream(fp: BinaryIO, max_size: int = 800) -> Optional[np.ndarray]:
+    """
+    Like decode_and_resize, but reads the image from a file-like object
+    (e.g. an upload's spooled file) instead of taking bytes
+    """
+    flags = _decode_flags(fp, max_size)
+    
+    # Read into a buffer sized from the file, in bounded chunks, so the encoded image
+    # is held once rather than also as one intermediate bytes object. Plain read()
+    # rather than readinto(): SpooledTemporaryFile only has readinto from Python 3.11
+    size = fp.seek(0, os.SEEK_END)
+    fp.seek(0)
+    buffer = np.empty(size, np.uint8)
+    view = memoryview(buffer)
+    filled = 0
+    while filled < size:
+        chunk = fp.read(min(_READ_CHUNK_SIZE, size - filled))
+        if not chunk:
+            break
+        view[filled:filled + len(chunk)] = chunk
+        filled += len(chunk)
+    
+    return _decode_buffer(buffer[:filled], flags, max_size)
+
+def _decode_flags(fp: BinaryIO, max_size: int) -> int:
+    """Pick imdecode flags from the image header, reducing resolution for large images"""
+    flags = cv2.IMREAD_COLOR
+    try:
+        # Reading the header is enough to get the dimensions
+        with Image.open(fp) as header:
+            if max(header.size) >= 2 * max_size:
+                flags = cv2.IMREAD_REDUCED_COLOR_2
+    except Exception:
+        pass
+    return flags
+
+def _decode_buffer(buffer: np.ndarray, flags: int, max_size: int) -> Optional[np.ndarray]:
+    """Decode an encoded image buffer and resize it to at most max_size"""
+    image = cv2.imdecode(buffer, flags)
+    if image is None:
+        return None
+    
+    return resize_image(image, max_size)
+
 def encode_image_to_base64(image: np.ndarray, format: str = "jpeg") -> str:
     """Encode an OpenCV image to base64"""
     # Choose the correct extension
@@ -74,13 +128,18 @@ def resize_image(image: np.ndarray, max_size: int = 800) -> np.ndarray:
     # Resize the image
     return cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
 
+def to_grayscale(image: np.ndarray) -> np.ndarray:
+    """Convert a BGR image to grayscale, passing grayscale images through unchanged"""
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
 def detect_text_area(image: np.ndarray) -> List[Tuple[int, int, int, int]]:
     """
-    Detect regions that likely contain text
+    Detect regions that likely contain text, in a BGR or already grayscale image
     Returns list of bounding boxes in format (x1, y1, x2, y2)
     """
-    # Convert to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = to_grayscale(image)
     
     # Apply Gaussian blur
     blurred = cv2.GaussianBlur(gray, (5, 5), 0)
@@ -149,11 +208,10 @@ def determine_direction(bbox_center_x: float, frame_width: float) -> str:
 
 def is_credit_card(image: np.ndarray) -> bool:
     """
-    Simple heuristic to check if an image contains a credit card
+    Simple heuristic to check if an image (BGR or already grayscale) contains a credit card
     This is a very basic implementation - in reality, you'd use a more sophisticated approach
     """
-    # Convert to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = to_grayscale(image)
     
     # Apply edge detection
     edges = cv2.Canny(gray, 50, 150)
@@ -161,7 +219,15 @@ def is_credit_card(image: np.ndarray) -> bool:
     # Check for rectangular shape with aspect ratio of a credit card
     contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
+    min_area = (image.shape[0] * image.shape[1]) / 16  # At least 1/16 of image
+    
     for contour in contours:
+        # The simplified polygon can't have a larger bounding box than the contour itself,
+        # so small contours are dropped before the expensive approximation
+        _, _, w, h = cv2.boundingRect(contour)
+        if w * h <= min_area:
+            continue
+        
         # Approximate contour to simplify shape
         epsilon = 0.02 * cv2.arcLength(contour, True)
         approx = cv2.approxPolyDP(contour, epsilon, True)
@@ -175,7 +241,7 @@ def is_credit_card(image: np.ndarray) -> bool:
             if 1.4 < aspect_ratio < 1.8:
                 # Check if it's large enough to be a card
                 area = w * h
-                if area > (image.shape[0] * image.shape[1]) / 16:  # At least 1/16 of image
+                if area > min_area:
                     return True
     
     return False
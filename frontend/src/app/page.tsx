@@ -95,13 +95,16 @@ export default function Home() {
         if (data.captions) {
           setCaptions((prev) => [...prev, ...data.captions]);
         }
-        if (data.voiceFeedback) {
+        // Replies to questions (they carry an audio caption) are spoken by the streamed audio
+        const isReply = data.captions?.some((c) => c.type === "audio") ?? false;
+        if (data.voiceFeedback && !isReply) {
           setVoiceFeedback(data.voiceFeedback);
         }
       },
       onError: (error) => {
         setError(error);
       },
+      onAudio: (audio) => apiService.playAudio(audio),
     });
 
     return () => {
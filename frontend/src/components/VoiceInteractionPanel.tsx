@@ -28,11 +28,15 @@ export const VoiceInteractionPanel = ({
 
   // Define handleMessage at the component level
   const handleMessage = (data: ProcessedFrame) => {
+    // Replies to the user's questions carry their question as an audio caption; their
+    // speech is streamed from the server and played by onAudio instead
+    const isReply = data.captions?.some((c) => c.type === "audio") ?? false;
+
     if (data.voiceFeedback) {
       setFeedback(data.voiceFeedback.text);
 
-      // Use the browser's speech synthesis to speak the response
-      if ("speechSynthesis" in window) {
+      // Use the browser's speech synthesis to speak other feedback, like sensitive-info alerts
+      if (!isReply && "speechSynthesis" in window) {
         const speech = new SpeechSynthesisUtterance(data.voiceFeedback.text);
         window.speechSynthesis.speak(speech);
       }
@@ -51,6 +55,7 @@ export const VoiceInteractionPanel = ({
     apiService.initializeWebSocket({
       onMessage: handleMessage,
       onError: (error) => console.error("WebSocket error:", error),
+      onAudio: (audio) => apiService.playAudio(audio),
       onConnectionStateChange: (isConnected) => {
         console.log(
           "WebSocket connection state:",
@@ -78,6 +83,7 @@ export const VoiceInteractionPanel = ({
       if ("speechSynthesis" in window) {
         window.speechSynthesis.cancel();
       }
+      apiService.stopAudio();
 
       // Clear any active timers
       if (timerRef.current) {
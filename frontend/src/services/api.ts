@@ -1,10 +1,46 @@
 // src/services/api.ts
+import { decode } from '@msgpack/msgpack';
 import { WebcamStream, ProcessedFrame } from '@/types/api';
 
+// Type prefixes for binary WebSocket messages (must match the backend)
+const BINARY_VIDEO = new Uint8Array([0x00]);
+const BINARY_AUDIO = new Uint8Array([0x01]);
+const AUDIO_CHUNK = 0x02;
+const AUDIO_END = 0x03;
+
+// Subprotocol asking the backend to send MessagePack instead of JSON
+const MSGPACK_SUBPROTOCOL = 'msgpack';
+
+const textDecoder = new TextDecoder();
+
+type ServerMessage = ProcessedFrame | { batch: ProcessedFrame[] };
+
+// The backend sends MessagePack if negotiated, otherwise JSON, as binary messages
+function parseMessage(data: string | ArrayBuffer, msgpack: boolean): ProcessedFrame[] {
+  if (typeof data !== 'string' && msgpack) {
+    return unpackBatch(decode(data) as ServerMessage);
+  }
+  const text = typeof data === 'string' ? data : textDecoder.decode(data);
+  return unpackBatch(JSON.parse(text) as ServerMessage);
+}
+
+// Messages queued together on the backend arrive as a single { batch: [...] } message
+function unpackBatch(message: ServerMessage): ProcessedFrame[] {
+  return 'batch' in message ? message.batch : [message];
+}
+
+// Streamed speech arrives as binary messages prefixed with AUDIO_CHUNK / AUDIO_END
+function isAudioMessage(data: string | ArrayBuffer): boolean {
+  if (typeof data === 'string' || data.byteLength === 0) return false;
+  const kind = new Uint8Array(data, 0, 1)[0];
+  return kind === AUDIO_CHUNK || kind === AUDIO_END;
+}
+
 interface WebSocketCallbacks {
   onMessage: (data: ProcessedFrame) => void;
   onError: (error: string) => void;
   onConnectionStateChange?: (isConnected: boolean) => void;
+  onAudio?: (audio: Blob) => void;
 }
 
 class ApiService {
@@ -17,6 +53,9 @@ class ApiService {
   private callbacks: WebSocketCallbacks | null = null;
   private frameQueue: WebcamStream[] = [];
   private isProcessingQueue = false;
+  private audioChunks: ArrayBuffer[] = [];
+  private playbackQueue: Blob[] = [];
+  private currentAudio: HTMLAudioElement | null = null;
 
   private constructor() {}
 
@@ -37,7 +76,8 @@ class ApiService {
       const wsUrl = process.env.NEXT_PUBLIC_WS_URL || 'ws://localhost:8000/ws';
       console.log('Connecting to WebSocket:', wsUrl);
       
-      this.ws = new WebSocket(wsUrl);
+      this.ws = new WebSocket(wsUrl, [MSGPACK_SUBPROTOCOL]);
+      this.ws.binaryType = 'arraybuffer';
 
       this.ws.onopen = () => {
         console.log('WebSocket connected');
@@ -48,9 +88,15 @@ class ApiService {
       };
 
       this.ws.onmessage = (event) => {
+        if (isAudioMessage(event.data)) {
+          this.handleAudioMessage(event.data as ArrayBuffer);
+          return;
+        }
+
         try {
-          const data = JSON.parse(event.data) as ProcessedFrame;
-          this.callbacks?.onMessage(data);
+          for (const data of this.parse(event.data)) {
+            this.callbacks?.onMessage(data);
+          }
         } catch (error) {
           console.error('Failed to parse WebSocket message:', error);
           this.callbacks?.onError('Failed to parse server message');
@@ -80,6 +126,23 @@ class ApiService {
     }
   }
 
+  private parse(data: string | ArrayBuffer): ProcessedFrame[] {
+    return parseMessage(data, this.ws?.protocol === MSGPACK_SUBPROTOCOL);
+  }
+
+  private handleAudioMessage(data: ArrayBuffer): void {
+    const kind = new Uint8Array(data, 0, 1)[0];
+    if (kind === AUDIO_CHUNK) {
+      this.audioChunks.push(data.slice(1));
+      return;
+    }
+
+    // End of stream: hand the assembled speech to the listener
+    const audio = new Blob(this.audioChunks, { type: 'audio/mpeg' });
+    this.audioChunks = [];
+    this.callbacks?.onAudio?.(audio);
+  }
+
   private handleReconnect(): void {
     if (!this.callbacks) return;
 
@@ -125,47 +188,8 @@ class ApiService {
       throw new Error('WebSocket is not connected');
     }
 
-    // We can't send FormData directly over WebSocket, so we'll send JSON instead
-    // For binary data like video/audio, we'll use Base64 encoding
-    try {
-      // Convert video blob to base64
-      const videoBase64 = await this.blobToBase64(frame.video);
-      
-      // Convert audio blob to base64
-      const audioBase64 = await this.blobToBase64(frame.audio);
-      
-      // Create a JSON message
-      const message = JSON.stringify({
-        type: 'frame',
-        data: {
-          video: videoBase64,
-          audio: audioBase64,
-          timestamp: frame.timestamp
-        }
-      });
-      
-      // Send the JSON message over WebSocket
-      this.ws.send(message);
-    } catch (error) {
-      console.error('Error preparing data for WebSocket:', error);
-      throw error;
-    }
-  }
-
-  // Helper method to convert a Blob to a base64 string
-  private blobToBase64(blob: Blob): Promise<string> {
-    return new Promise((resolve, reject) => {
-      const reader = new FileReader();
-      reader.onloadend = () => {
-        // reader.result is a data URL like "data:image/jpeg;base64,/9j/4AAQSkZ..."
-        // We only want the base64 part after the comma
-        const base64String = reader.result as string;
-        const base64Data = base64String.split(',')[1];
-        resolve(base64Data);
-      };
-      reader.onerror = reject;
-      reader.readAsDataURL(blob);
-    });
+    // Frames are sent as binary messages: a 1-byte type prefix followed by the raw video bytes
+    this.ws.send(new Blob([BINARY_VIDEO, frame.video]));
   }
 
   async sendFrame(frame: WebcamStream): Promise<ProcessedFrame | null> {
@@ -183,11 +207,13 @@ class ApiService {
       return new Promise((resolve, reject) => {
         // Set up a one-time message handler to catch the response
         const handleMessage = (event: MessageEvent) => {
+          if (isAudioMessage(event.data)) return;
           try {
-            const data = JSON.parse(event.data) as ProcessedFrame;
+            // A batch resolves with its most recent message
+            const messages = this.parse(event.data);
             this.ws?.removeEventListener('message', handleMessage);
             clearTimeout(timeout);
-            resolve(data);
+            resolve(messages[messages.length - 1] ?? null);
           } catch (error) {
             reject(error);
           }
@@ -237,29 +263,19 @@ class ApiService {
     }
 
     try {
-      // Convert audio blob to base64
-      const audioBase64 = await this.blobToBase64(audioBlob);
-      
-      // Create a JSON message
-      const message = JSON.stringify({
-        type: 'audio',
-        data: {
-          audio: audioBase64,
-          timestamp: Date.now()
-        }
-      });
-      
-      // Send the JSON message over WebSocket
-      this.ws.send(message);
+      // Send the raw audio as a binary message with the audio type prefix
+      this.ws.send(new Blob([BINARY_AUDIO, audioBlob]));
       
       // Return a Promise that will resolve when we get a response
       return new Promise((resolve, reject) => {
         const handleMessage = (event: MessageEvent) => {
+          if (isAudioMessage(event.data)) return;
           try {
-            const data = JSON.parse(event.data) as ProcessedFrame;
+            // A batch resolves with its most recent message
+            const messages = this.parse(event.data);
             this.ws?.removeEventListener('message', handleMessage);
             clearTimeout(timeout);
-            resolve(data);
+            resolve(messages[messages.length - 1] ?? null);
           } catch (error) {
             reject(error);
           }
@@ -278,6 +294,42 @@ class ApiService {
     }
   }
 
+  // Play streamed speech; utterances are queued so a new reply doesn't talk over the previous one
+  playAudio(audio: Blob): void {
+    this.playbackQueue.push(audio);
+    if (!this.currentAudio) this.playNextAudio();
+  }
+
+  stopAudio(): void {
+    this.playbackQueue = [];
+    if (this.currentAudio) {
+      this.currentAudio.pause();
+      URL.revokeObjectURL(this.currentAudio.src);
+      this.currentAudio = null;
+    }
+  }
+
+  private playNextAudio(): void {
+    const next = this.playbackQueue.shift();
+    if (!next) {
+      this.currentAudio = null;
+      return;
+    }
+
+    const audio = new Audio(URL.createObjectURL(next));
+    this.currentAudio = audio;
+    const done = () => {
+      URL.revokeObjectURL(audio.src);
+      if (this.currentAudio === audio) this.playNextAudio();
+    };
+    audio.onended = done;
+    audio.onerror = done;
+    audio.play().catch((error) => {
+      console.error('Failed to play speech:', error);
+      done();
+    });
+  }
+
   disconnect(): void {
     if (this.ws) {
       this.ws.close();
@@ -288,6 +340,8 @@ class ApiService {
     this.callbacks = null;
     this.frameQueue = [];
     this.isProcessingQueue = false;
+    this.audioChunks = [];
+    this.stopAudio();
   }
 }
 